@@ -6,9 +6,17 @@ import queue
 import time
 import sqlite3
 import datetime
+import os
+import mmap
+import struct
+import zlib
+import numpy as np
 from ttkthemes import ThemedTk
 from collections import deque
-import pystray
+try:
+    import pystray
+except Exception: # Pas de session graphique (collecteur lancé sans interface)
+    pystray = None
 from PIL import Image
 
 try:
@@ -17,18 +25,2562 @@ try:
 except ImportError:
     NVIDIA_AVAILABLE = False 
 import json
+import gzip
+import io
+import base64
+import html
+import argparse
+import multiprocessing
+import signal
+import subprocess
+import sys
+from multiprocessing import shared_memory, resource_tracker
+from dataclasses import dataclass, asdict, fields, replace
+import re
 
 # --- Matplotlib dans Tkinter ---
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_agg import FigureCanvasAgg # Rapport hors écran
 
 # --- Paramètres ---
 UPDATE_INTERVAL_MS = 1000  # Intervalle de collecte (en ms)
 GRAPH_HISTORY_SIZE = 60    # Garder 60 points pour le graphique (ex: 60 secondes)
 TOP_PROCESS_COUNT = 10     # Afficher les 10 processus les plus gourmands
+GROUP_CHILDREN_LIMIT = 25  # Nombre max d'enfants affichés sous un groupe
+
+# --- Modes de regroupement des processus ---
+AGGREGATION_MODES = {
+    "pid": "Processus",
+    "tree": "Arbre",
+    "name": "Nom",
+    "user": "Utilisateur",
+    "cgroup": "cgroup",
+}
+INIT_PIDS = (0, 1)  # Les enfants directs d'init sont traités comme des racines
+
+def _process_node(pinfo):
+    """Construit un noeud (feuille) pour un processus seul."""
+    return {
+        "key": f"pid:{pinfo['pid']}",
+        "label": f"{pinfo.get('name') or '?'} ({pinfo['pid']})",
+        "pid": pinfo['pid'],
+        "cpu_percent": pinfo['cpu_percent'],
+        "memory_percent": pinfo.get('memory_percent') or 0.0,
+        "count": 1,
+        "children": []
+    }
+
+def _build_tree_groups(processes):
+    """
+    Regroupe les processus par arbre (ppid).
+    L'index ppid -> enfants est construit une seule fois, puis les totaux
+    sont cumulés en post-ordre (itératif) : O(n) au total.
+    Comme psutil.Process.parent(), un parent né APRÈS l'enfant est ignoré
+    (ppid périmé après réutilisation du PID, fréquent sous Windows).
+    """
+    by_pid = {p['pid']: p for p in processes}
+    children = {}
+    parent_of = {}
+    roots = []
+    for p in processes:
+        ppid = p.get('ppid')
+        parent = by_pid.get(ppid)
+        if (parent is not None and ppid != p['pid'] and ppid not in INIT_PIDS
+                and (parent.get('create_time') or 0) <= (p.get('create_time') or 0)):
+            children.setdefault(ppid, []).append(p['pid'])
+            parent_of[p['pid']] = ppid
+        else:
+            roots.append(p['pid'])
+
+    # Cumul des totaux (enfants avant parents)
+    totals = {}
+    pending = list(roots)
+    while pending or len(totals) < len(by_pid):
+        if not pending:
+            # Cycle restant (dates de création identiques) : le couper à un processus non atteint
+            root = next(pid for pid in by_pid if pid not in totals)
+            children[parent_of.pop(root)].remove(root)
+            roots.append(root)
+            pending.append(root)
+        stack = [(pending.pop(), False)]
+        while stack:
+            pid, visited = stack.pop()
+            if not visited:
+                stack.append((pid, True))
+                stack.extend((child, False) for child in children.get(pid, ()))
+                continue
+            pinfo = by_pid[pid]
+            cpu = pinfo['cpu_percent']
+            mem = pinfo.get('memory_percent') or 0.0
+            count = 1
+            for child in children.get(pid, ()):
+                c_cpu, c_mem, c_count = totals[child]
+                cpu += c_cpu
+                mem += c_mem
+                count += c_count
+            totals[pid] = (cpu, mem, count)
+
+    def make_node(pid):
+        pinfo = by_pid[pid]
+        cpu, mem, count = totals[pid]
+        kids = sorted(children.get(pid, ()), key=lambda c: totals[c][0], reverse=True)
+        return {
+            "key": f"tree:{pid}",
+            "label": f"{pinfo.get('name') or '?'} ({pid})",
+            "pid": pid,
+            "cpu_percent": cpu,
+            "memory_percent": mem,
+            "count": count,
+            "children": [make_node(c) for c in kids[:GROUP_CHILDREN_LIMIT]]
+        }
+
+    roots.sort(key=lambda pid: totals[pid][0], reverse=True)
+    return [make_node(pid) for pid in roots]
+
+def build_process_groups(processes, mode):
+    """
+    Agrège CPU/RAM par arbre de processus, nom d'exécutable ou utilisateur.
+    Renvoie une liste de groupes triés par CPU décroissant.
+    Chaque groupe : {"key", "label", "cpu_percent", "memory_percent", "count", "children"}
+    """
+    if mode == "tree":
+        return _build_tree_groups(processes)
+
+    field = {"name": "name", "user": "username", "cgroup": "cgroup"}[mode]
+    groups = {}
+    for pinfo in processes:
+        label = pinfo.get(field) or "?"
+        group = groups.get(label)
+        if group is None:
+            group = groups[label] = {
+                "key": f"{mode}:{label}",
+                "label": label,
+                "cpu_percent": 0.0,
+                "memory_percent": 0.0,
+                "count": 0,
+                "children": []
+            }
+        group["cpu_percent"] += pinfo['cpu_percent']
+        group["memory_percent"] += pinfo.get('memory_percent') or 0.0
+        group["count"] += 1
+        group["children"].append(_process_node(pinfo))
+
+    for group in groups.values():
+        group["children"].sort(key=lambda n: n['cpu_percent'], reverse=True)
+        del group["children"][GROUP_CHILDREN_LIMIT:]
+
+    return sorted(groups.values(), key=lambda g: g['cpu_percent'], reverse=True)
+
+# --- Recherche / surveillance de processus ---
+FILTER_RESULT_LIMIT = 200 # Lignes max affichées pour un filtre
+WATCH_RESULT_LIMIT = 50   # Processus max enregistrés par tick pour la liste de surveillance
+FILTER_DEBOUNCE_MS = 150  # Délai après la dernière frappe avant de filtrer
+
+def parse_process_filter(text):
+    """
+    Analyse un filtre de recherche. Les termes sont combinés en ET :
+      firefox      -> sous-chaîne du nom (insensible à la casse)
+      re:^python   -> expression régulière sur le nom
+      user:bob     -> utilisateur exact
+      pid:1234     -> PID exact
+      cmd:--port   -> sous-chaîne de la ligne de commande
+    Lève re.error (regex invalide) ou ValueError (PID invalide).
+    """
+    terms = []
+    for token in text.split():
+        kind, sep, value = token.partition(":")
+        if not sep or kind not in ("re", "user", "pid", "cmd") or not value:
+            terms.append(("name", token.lower()))
+        elif kind == "re":
+            terms.append(("re", re.compile(value, re.IGNORECASE)))
+        elif kind == "pid":
+            terms.append(("pid", int(value)))
+        elif kind == "cmd":
+            terms.append(("cmd", value.lower()))
+        else:
+            terms.append(("user", value))
+    return terms
+
+class ProcessIndex:
+    """
+    Index des processus vivants, clé (pid, create_time), mis à jour
+    par différence à chaque scan du worker. Index secondaires par PID,
+    utilisateur et nom : un filtre ne parcourt que les noms distincts
+    (quelques centaines) au lieu de toutes les lignes.
+    """
 
-class ProcessMonitorApp(ThemedTk):
     def __init__(self):
+        self.lock = threading.Lock() # Écrit par le worker, lu par la GUI
+        self.entries = {} # {clé: infos du processus}
+        self.by_pid = {}  # {pid: clé}
+        self.by_user = {} # {utilisateur: {clés}}
+        self.by_name = {} # {nom en minuscules: {clés}}
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def update(self, scanned):
+        """
+        Applique le résultat d'un scan {clé: pinfo}.
+        Renvoie (clés ajoutées, entrées retirées).
+        """
+        with self.lock:
+            removed = [self._remove(key) for key in self.entries.keys() - scanned.keys()]
+            added = []
+            for key, pinfo in scanned.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    self._add(key, pinfo)
+                    added.append(key)
+                else:
+                    entry['cpu_percent'] = pinfo['cpu_percent'] or 0.0
+                    entry['memory_percent'] = pinfo['memory_percent'] or 0.0
+                    # Pics sur la durée de vie (enregistrés à la sortie du processus)
+                    entry['_peak_cpu'] = max(entry['_peak_cpu'], entry['cpu_percent'])
+                    entry['_peak_memory'] = max(entry['_peak_memory'], entry['memory_percent'])
+                    if 'cgroup' in pinfo:
+                        entry['cgroup'] = pinfo['cgroup']
+        return added, removed
+
+    def _add(self, key, pinfo):
+        entry = {
+            "pid": pinfo['pid'],
+            "create_time": pinfo.get('create_time'),
+            "name": pinfo.get('name') or "?",
+            "username": pinfo.get('username') or "?",
+            "cmdline": pinfo.get('cmdline') or "",
+            "cpu_percent": pinfo['cpu_percent'] or 0.0,
+            "memory_percent": pinfo['memory_percent'] or 0.0
+        }
+        if 'cgroup' in pinfo:
+            entry['cgroup'] = pinfo['cgroup']
+        entry['_cmd_lower'] = entry['cmdline'].lower()
+        entry['_peak_cpu'] = entry['cpu_percent']
+        entry['_peak_memory'] = entry['memory_percent']
+        self.entries[key] = entry
+        self.by_pid[entry['pid']] = key
+        self.by_user.setdefault(entry['username'], set()).add(key)
+        self.by_name.setdefault(entry['name'].lower(), set()).add(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        if self.by_pid.get(entry['pid']) == key:
+            del self.by_pid[entry['pid']]
+        for index, value in ((self.by_user, entry['username']), (self.by_name, entry['name'].lower())):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+        return entry
+
+    def search(self, terms, limit=FILTER_RESULT_LIMIT):
+        """Renvoie des copies des processus correspondant à tous les termes (tri CPU décroissant)."""
+        with self.lock:
+            candidates = None
+            cmd_terms = []
+            for kind, value in terms:
+                if kind == "pid":
+                    key = self.by_pid.get(value)
+                    matched = {key} if key else set()
+                elif kind == "user":
+                    matched = self.by_user.get(value, set())
+                elif kind == "name":
+                    matched = set()
+                    for name, keys in self.by_name.items():
+                        if value in name:
+                            matched |= keys
+                elif kind == "re":
+                    matched = set()
+                    for name, keys in self.by_name.items():
+                        if value.search(name):
+                            matched |= keys
+                else:
+                    cmd_terms.append(value)
+                    continue
+                candidates = matched if candidates is None else candidates & matched
+
+            if candidates is None:
+                candidates = self.entries.keys() # Seulement des termes 'cmd:'
+            results = []
+            for key in candidates:
+                entry = self.entries[key]
+                if all(term in entry['_cmd_lower'] for term in cmd_terms):
+                    results.append({k: v for k, v in entry.items() if not k.startswith('_')})
+
+        results.sort(key=lambda e: e['cpu_percent'], reverse=True)
+        return results[:limit]
+
+    def apply_changes(self, message):
+        """
+        Applique un message de changements émis par un collecteur hors processus
+        (voir Collector.emit_index_changes) : la GUI garde ainsi une copie
+        interrogeable de l'index sans scanner les processus elle-même.
+        """
+        with self.lock:
+            if message.get("index_reset"):
+                for key in list(self.entries):
+                    self._remove(key)
+            for key in message.get("index_removed", []):
+                key = tuple(key)
+                if key in self.entries:
+                    self._remove(key)
+            for row in message.get("index_added", []):
+                key = (row['pid'], row['create_time'])
+                if key in self.entries:
+                    self._remove(key)
+                self._add(key, row)
+            for pid, create_time, cpu, memory in message.get("index_usage", []):
+                entry = self.entries.get((pid, create_time))
+                if entry is not None:
+                    entry['cpu_percent'] = cpu
+                    entry['memory_percent'] = memory
+
+# --- Détails mémoire par processus (coûteux, collectés par budget) ---
+DETAIL_BUDGET_MS = 50        # Temps max consacré aux détails par tick
+DETAIL_PRIORITY_COUNT = 10   # Top N par CPU ET par RAM rafraîchis en priorité
+DETAIL_STALE_S = 10          # Au-delà, la valeur est affichée comme ancienne ('*')
+DETAIL_DENIED_RETRY_S = 60   # Ne pas réessayer trop souvent un processus protégé
+DETAIL_PRIORITY_MIN_AGE_S = 2 # Un prioritaire plus récent que ça n'est pas relu
+DETAIL_ROTATION_SHARE = 0.5  # Part du budget réservée à la rotation (les prioritaires ne peuvent pas tout prendre)
+
+class ProcessDetailCollector:
+    """
+    Rafraîchit les champs coûteux (USS/PSS/swap via memory_full_info, threads,
+    descripteurs/handles ouverts) pour un sous-ensemble tournant de processus,
+    dans un budget de temps par tick. Les processus prioritaires (top consommateurs,
+    surveillés) passent d'abord s'ils ont plus de DETAIL_PRIORITY_MIN_AGE_S, sans
+    dépasser leur part du budget, puis la rotation reprend là où elle s'était arrêtée.
+    Les résultats sont mis en cache avec leur date de mise à jour.
+    """
+
+    def __init__(self, budget_ms=DETAIL_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.cache = {}   # {(pid, create_time): détails}
+        self.rotation = 0 # Position dans la rotation
+
+    def _refresh_one(self, key, proc):
+        now = time.time()
+        previous = self.cache.get(key)
+        if previous and previous.get('denied') and now - previous['updated'] < DETAIL_DENIED_RETRY_S:
+            return
+        try:
+            with proc.oneshot():
+                mem = proc.memory_full_info()
+                num_threads = proc.num_threads()
+                # Unix : descripteurs ouverts ; Windows : handles
+                num_fds = proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+            self.cache[key] = {
+                "uss": mem.uss,
+                "pss": getattr(mem, 'pss', None), # Linux uniquement
+                "swap": getattr(mem, 'swap', None), # Linux uniquement
+                "num_threads": num_threads,
+                "num_fds": num_fds,
+                "updated": now
+            }
+        except psutil.AccessDenied:
+            self.cache[key] = {"denied": True, "updated": now}
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            self.cache.pop(key, None)
+
+    def refresh(self, procs, priority_keys):
+        """
+        'procs' : {clé: psutil.Process} des processus vivants.
+        'priority_keys' : clés à rafraîchir en premier (dans l'ordre).
+        Renvoie le nombre de processus rafraîchis.
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + self.budget_ms / 1000.0
+        priority_deadline = start_time + self.budget_ms * (1 - DETAIL_ROTATION_SHARE) / 1000.0
+
+        # Oublier les processus morts
+        for key in self.cache.keys() - procs.keys():
+            del self.cache[key]
+
+        done = set()
+        refreshed = 0
+        now = time.time()
+        for key in priority_keys:
+            if time.perf_counter() >= priority_deadline:
+                break
+            if key in procs and key not in done:
+                done.add(key)
+                entry = self.cache.get(key)
+                if entry and now - entry['updated'] < DETAIL_PRIORITY_MIN_AGE_S:
+                    continue # Encore frais : laisser le budget à la rotation
+                self._refresh_one(key, procs[key])
+                refreshed += 1
+
+        # Rotation sur le reste, dans le budget restant
+        keys = list(procs)
+        if not keys:
+            return refreshed
+        start = self.rotation % len(keys)
+        step = 0
+        while step < len(keys) and time.perf_counter() < deadline:
+            key = keys[(start + step) % len(keys)]
+            step += 1
+            if key not in done:
+                self._refresh_one(key, procs[key])
+                done.add(key)
+                refreshed += 1
+        self.rotation = start + step
+        return refreshed
+
+    def export_rows(self, exported):
+        """
+        Lignes [pid, create_time, uss, pss, swap, threads, fds, date] rafraîchies
+        depuis le dernier envoi. 'exported' ({clé: date envoyée}) est mis à jour
+        et purgé des processus disparus.
+        """
+        rows = []
+        for key in exported.keys() - self.cache.keys():
+            del exported[key]
+        for key, entry in self.cache.items():
+            if entry.get('denied') or exported.get(key) == entry['updated']:
+                continue
+            exported[key] = entry['updated']
+            rows.append([key[0], key[1], entry['uss'], entry['pss'], entry['swap'],
+                         entry['num_threads'], entry['num_fds'], entry['updated']])
+        return rows
+
+    def apply_changes(self, message):
+        """
+        Côté GUI d'un collecteur hors processus : applique les détails reçus
+        (voir Collector.emit_index_changes) au lieu de les collecter soi-même.
+        """
+        if message.get("index_reset"):
+            self.cache.clear()
+        for key in message.get("index_removed", []):
+            self.cache.pop(tuple(key), None)
+        for pid, create_time, uss, pss, swap, num_threads, num_fds, updated in message.get("index_details", []):
+            self.cache[(pid, create_time)] = {
+                "uss": uss, "pss": pss, "swap": swap,
+                "num_threads": num_threads, "num_fds": num_fds, "updated": updated
+            }
+
+    def details(self, key):
+        """Détails en cache pour une clé (avec leur âge en secondes), ou None."""
+        entry = self.cache.get(key)
+        if entry is None or entry.get('denied'):
+            return None
+        result = dict(entry)
+        result['detail_age'] = time.time() - result.pop('updated')
+        return result
+
+# --- cgroup v2 ---
+CGROUP_ROOT = "/sys/fs/cgroup" # Racine par défaut (configurable dans config.json)
+CGROUP_MAX_DEPTH = 2           # Profondeur max parcourue (ex: /system.slice/nginx.service)
+CGROUP_INTERVAL_S = 5          # Intervalle de collecte/sauvegarde des cgroups
+
+class CgroupCollector:
+    """
+    Collecte cpu.stat, memory.current, memory.max et io.stat pour chaque cgroup v2
+    sous une racine donnée. Les racines (cgroupfs et /proc) sont configurables,
+    ce qui permet de tester le collecteur sur une fausse arborescence.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, proc_root="/proc", max_depth=CGROUP_MAX_DEPTH):
+        self.root = root
+        self.proc_root = proc_root
+        self.max_depth = max_depth
+        self.cpu_count = psutil.cpu_count() or 1
+        self.previous = {}    # {chemin: (instant, usage_usec, rbytes, wbytes, inode)}
+        self.pid_cgroups = {} # Cache {pid: chemin du cgroup}, vidé à chaque scan()
+        # Chemin de 'root' dans la hiérarchie (ce qu'affiche /proc/<pid>/cgroup)
+        self.hierarchy_prefix = self._hierarchy_prefix()
+
+    def _hierarchy_prefix(self):
+        """
+        Les chemins de /proc/<pid>/cgroup partent de la racine de la hiérarchie,
+        ceux de scan() de 'root'. Renvoie le chemin de 'root' dans la hiérarchie
+        (via le point de montage cgroup2 de mountinfo), ou "/" si 'root' n'est
+        sous aucun montage connu (fausse arborescence : 'root' est la racine).
+        """
+        root = os.path.realpath(self.root)
+        best = None
+        content = self._read_file(os.path.join(self.proc_root, "self"), "mountinfo")
+        for line in (content or "").splitlines():
+            parts, sep, tail = line.partition(" - ")
+            parts = parts.split()
+            if not sep or len(parts) < 5 or not tail.startswith("cgroup2 "):
+                continue
+            mount_root, mount_point = parts[3], parts[4]
+            if root == mount_point or root.startswith(mount_point.rstrip("/") + "/"):
+                if best is None or len(mount_point) > len(best[1]):
+                    best = (mount_root, mount_point)
+        if best is None:
+            return "/"
+        relative = os.path.relpath(root, best[1])
+        prefix = best[0] if relative == "." else os.path.join(best[0], relative)
+        return "/" + prefix.strip("/")
+
+    def is_available(self):
+        """cgroup v2 est monté si 'cgroup.controllers' existe à la racine."""
+        return os.path.isfile(os.path.join(self.root, "cgroup.controllers"))
+
+    def _read_file(self, directory, filename):
+        try:
+            with open(os.path.join(directory, filename), 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _read_cgroup(self, directory):
+        """Lit les compteurs bruts d'un cgroup (None si le fichier manque)."""
+        usage_usec = None
+        cpu_stat = self._read_file(directory, "cpu.stat")
+        if cpu_stat:
+            for line in cpu_stat.splitlines():
+                parts = line.split()
+                if len(parts) == 2 and parts[0] == "usage_usec":
+                    usage_usec = int(parts[1])
+
+        memory_current = self._read_file(directory, "memory.current")
+        memory_current = int(memory_current) if memory_current else None
+
+        memory_max = self._read_file(directory, "memory.max")
+        if memory_max is None or memory_max.strip() == "max":
+            memory_max = None # Pas de limite
+        else:
+            memory_max = int(memory_max)
+
+        rbytes = wbytes = 0
+        io_stat = self._read_file(directory, "io.stat")
+        if io_stat:
+            # Format : "8:0 rbytes=123 wbytes=456 rios=1 wios=2 ..."
+            for line in io_stat.splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        rbytes += int(value)
+                    elif key == "wbytes":
+                        wbytes += int(value)
+
+        return usage_usec, memory_current, memory_max, rbytes, wbytes
+
+    def _walk(self):
+        """Parcourt les répertoires de cgroups jusqu'à 'max_depth'."""
+        stack = [(self.root, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            yield directory
+            if depth >= self.max_depth:
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, depth + 1))
+            except OSError:
+                pass
+
+    def scan(self, now=None):
+        """
+        Lit tous les cgroups et calcule l'utilisation CPU à partir des deltas de
+        'usage_usec' (en % de la machine entière, comme psutil.cpu_percent).
+        Renvoie une liste de dicts ; 'cpu_percent' vaut None au premier passage.
+        """
+        now = time.monotonic() if now is None else now
+        results = []
+        seen = set()
+        # Les processus ont pu changer de cgroup : relire /proc/<pid>/cgroup
+        self.pid_cgroups.clear()
+
+        for directory in self._walk():
+            usage_usec, memory_current, memory_max, rbytes, wbytes = self._read_cgroup(directory)
+            try:
+                inode = os.stat(directory).st_ino # Change si le cgroup est recréé au même chemin
+            except OSError:
+                continue # Supprimé pendant le parcours
+            path = "/" + os.path.relpath(directory, self.root).replace(os.sep, "/")
+            if path == "/.":
+                path = "/"
+            seen.add(path)
+
+            cpu_percent = io_read_bps = io_write_bps = None
+            prev = self.previous.get(path)
+            # Compteurs remis à zéro (cgroup recréé, service redémarré) : pas de delta,
+            # on repart des nouvelles valeurs au prochain passage
+            if prev and prev[4] == inode and now > prev[0]:
+                elapsed = now - prev[0]
+                if usage_usec is not None and prev[1] is not None and usage_usec >= prev[1]:
+                    cpu_percent = (usage_usec - prev[1]) / (elapsed * 1e6 * self.cpu_count) * 100
+                if rbytes >= prev[2]:
+                    io_read_bps = (rbytes - prev[2]) / elapsed
+                if wbytes >= prev[3]:
+                    io_write_bps = (wbytes - prev[3]) / elapsed
+            self.previous[path] = (now, usage_usec, rbytes, wbytes, inode)
+
+            memory_percent = None
+            if memory_current is not None and memory_max:
+                memory_percent = memory_current / memory_max * 100
+
+            results.append({
+                "path": path,
+                "cpu_percent": cpu_percent,
+                "memory_current": memory_current,
+                "memory_max": memory_max,
+                "memory_percent": memory_percent,
+                "io_read_bps": io_read_bps,
+                "io_write_bps": io_write_bps
+            })
+
+        # Oublier les cgroups supprimés
+        for path in list(self.previous.keys()):
+            if path not in seen:
+                del self.previous[path]
+
+        return results
+
+    def cgroup_of(self, pid):
+        """
+        Renvoie le chemin du cgroup d'un PID, relatif à 'root' comme dans scan()
+        ("?" si inconnu ou hors de 'root'). Lu dans /proc/<pid>/cgroup, mis en
+        cache jusqu'au prochain scan().
+        """
+        path = self.pid_cgroups.get(pid)
+        if path is None:
+            content = self._read_file(os.path.join(self.proc_root, str(pid)), "cgroup")
+            path = "?"
+            for line in (content or "").splitlines():
+                # Ligne cgroup v2 unifiée : "0::/system.slice/nginx.service"
+                if line.startswith("0::"):
+                    path = self._relative_to_root(line[3:].strip() or "/")
+            self.pid_cgroups[pid] = path
+        return path
+
+    def _relative_to_root(self, path):
+        """Chemin de la hiérarchie -> chemin relatif à 'root' (ou "?" s'il est en dehors)."""
+        prefix = self.hierarchy_prefix
+        if prefix == "/":
+            return path
+        if path == prefix:
+            return "/"
+        if path.startswith(prefix + "/"):
+            return path[len(prefix):]
+        return "?"
+
+    def prune(self, live_pids):
+        """Retire du cache les PID qui n'existent plus."""
+        for pid in list(self.pid_cgroups.keys()):
+            if pid not in live_pids:
+                del self.pid_cgroups[pid]
+
+# --- Archive colonnaire (historique froid) ---
+ARCHIVE_DIR = "archive"
+ARCHIVE_MAGIC = b"PMC2"
+ARCHIVE_HEADER = struct.Struct("<4sdII") # magic, échelle, nombre de points, nombre de blocs
+ARCHIVE_BLOCK = struct.Struct("<qII")    # par bloc : première valeur, nombre de points, octets compressés
+ARCHIVE_MAGIC_V1 = b"PMC1"               # Ancien format : un seul flux pour toute la journée
+ARCHIVE_HEADER_V1 = struct.Struct("<4sdqI") # magic, échelle, première valeur, nombre de points
+ARCHIVE_BLOCK_S = 3600 # Blocs horaires : une plage courte ne décode que les heures touchées
+# Colonnes archivées et leur échelle de quantification (valeur = entier / échelle)
+ARCHIVE_COLUMNS = {
+    "timestamp": 1000.0,   # millisecondes
+    "cpu_percent": 100.0,  # centièmes de %
+    "ram_percent": 100.0,
+    "gpu_percent": 100.0,
+    "fan_rpm": 1.0,
+    "proc_churn": 100.0,   # processus créés par seconde
+}
+
+def _wall_epoch(dt):
+    """Secondes depuis 1970 pour un datetime 'naïf' (heure locale, comme stocké dans la DB)."""
+    return (dt - datetime.datetime(1970, 1, 1)).total_seconds()
+
+class ColumnarArchive:
+    """
+    Archive les journées terminées de 'system_stats' en fichiers colonnes
+    (un par métrique), quantifiés, encodés en deltas puis compressés (zlib)
+    par blocs d'une heure. Un petit 'index.json' décrit les journées et leurs
+    blocs. La relecture passe par mmap, ne décompresse que les blocs demandés
+    et renvoie des tableaux NumPy. La DB SQLite reste le tier "chaud".
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 1, "days": {}}
+
+    def _save_index(self):
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(tmp_file, self.index_file) # Remplacement atomique
+
+    def has_day(self, day):
+        return day.isoformat() in self.index["days"]
+
+    def _write_column(self, path, values, scale, bounds=None):
+        """
+        Écrit une colonne : en-tête, table des blocs, puis les deltas int32
+        compressés de chaque bloc. 'bounds' : indices de début des blocs
+        (communs à toutes les colonnes d'une journée), un seul bloc par défaut.
+        """
+        quantized = np.round(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+        if not len(quantized):
+            bounds = []
+        elif bounds is None:
+            bounds = [0]
+        edges = list(bounds) + [len(quantized)]
+        table, payloads = [], []
+        for begin, end in zip(edges, edges[1:]):
+            block = quantized[begin:end]
+            payload = zlib.compress(np.diff(block).astype(np.int32).tobytes(), 6)
+            table.append(ARCHIVE_BLOCK.pack(int(block[0]), len(block), len(payload)))
+            payloads.append(payload)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, scale, len(quantized), len(table)))
+            f.writelines(table)
+            f.writelines(payloads)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _decode_block(data, first, count):
+        """Deltas compressés -> valeurs quantifiées (int64)."""
+        values = np.empty(count, dtype=np.int64)
+        values[0] = first
+        if count > 1:
+            np.cumsum(np.frombuffer(zlib.decompress(data), dtype=np.int32), out=values[1:])
+            values[1:] += first
+        return values
+
+    def _read_column(self, path, blocks=None):
+        """
+        Relit une colonne via mmap (sans copie des données compressées) et la
+        décode en tableau float64. 'blocks' : indices des blocs voulus (tous par défaut).
+        """
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                magic = bytes(view[:4])
+                if magic == ARCHIVE_MAGIC_V1: # Journée archivée avant les blocs
+                    _, scale, first, count = ARCHIVE_HEADER_V1.unpack_from(view, 0)
+                    if count == 0:
+                        return np.empty(0, dtype=np.float64)
+                    return self._decode_block(view[ARCHIVE_HEADER_V1.size:], first, count) / scale
+                if magic != ARCHIVE_MAGIC:
+                    raise ValueError(f"Fichier d'archive invalide : {path}")
+                _, scale, count, block_count = ARCHIVE_HEADER.unpack_from(view, 0)
+                offset = ARCHIVE_HEADER.size + block_count * ARCHIVE_BLOCK.size
+                wanted = range(block_count) if blocks is None else set(blocks)
+                chunks = []
+                for i in range(block_count):
+                    first, rows, size = ARCHIVE_BLOCK.unpack_from(view, ARCHIVE_HEADER.size + i * ARCHIVE_BLOCK.size)
+                    if i in wanted:
+                        chunks.append(self._decode_block(view[offset:offset + size], first, rows))
+                    offset += size
+        if not chunks:
+            return np.empty(0, dtype=np.float64)
+        return np.concatenate(chunks) / scale
+
+    def export_day(self, conn, day):
+        """Exporte une journée de 'system_stats' dans l'archive. Renvoie le nombre de lignes."""
+        start = datetime.datetime.combine(day, datetime.time())
+        end = start + datetime.timedelta(days=1)
+        metrics = [name for name in ARCHIVE_COLUMNS if name != "timestamp"]
+        rows = conn.execute(
+            f"SELECT timestamp, {', '.join(metrics)} FROM system_stats "
+            "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (start, end)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        # Timestamps -> secondes (heure murale), sans passer par datetime ligne par ligne
+        base = _wall_epoch(start)
+        timestamps = np.array([r[0] for r in rows], dtype='datetime64[us]')
+        seconds = base + (timestamps - np.datetime64(start, 'us')) / np.timedelta64(1, 's')
+        data = np.array([r[1:] for r in rows], dtype=np.float64)
+        np.nan_to_num(data, copy=False) # Colonnes NULL (anciennes lignes) -> 0
+
+        # Début de chaque bloc horaire (mêmes lignes pour toutes les colonnes)
+        block_ids = np.floor((seconds - base) / ARCHIVE_BLOCK_S).astype(np.int64)
+        bounds = [0] + (np.flatnonzero(np.diff(block_ids)) + 1).tolist()
+
+        day_dir = os.path.join(self.directory, day.isoformat())
+        os.makedirs(day_dir, exist_ok=True)
+        columns = {"timestamp": seconds}
+        for i, name in enumerate(metrics):
+            columns[name] = data[:, i]
+        for name, values in columns.items():
+            self._write_column(os.path.join(day_dir, name + ".col"), values, ARCHIVE_COLUMNS[name], bounds)
+
+        ends = bounds[1:] + [len(rows)]
+        self.index["days"][day.isoformat()] = {
+            "count": len(rows),
+            "start": float(seconds[0]),
+            "end": float(seconds[-1]),
+            "metrics": list(columns.keys()),
+            # [début, fin] de chaque bloc, pour ne relire que les blocs utiles
+            "blocks": [[float(seconds[b]), float(seconds[e - 1])] for b, e in zip(bounds, ends)]
+        }
+        self._save_index()
+        return len(rows)
+
+    def export_finished_days(self, conn, stop_event=None):
+        """
+        Exporte toutes les journées terminées (avant aujourd'hui) pas encore archivées.
+        S'interrompt entre deux journées si 'stop_event' est levé (reprise au passage suivant).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        row = conn.execute("SELECT MIN(timestamp) FROM system_stats").fetchone()
+        if not row or row[0] is None:
+            return 0
+        day = datetime.datetime.fromisoformat(str(row[0])).date()
+        today = datetime.date.today()
+        exported = 0
+        while day < today:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if not self.has_day(day):
+                count = self.export_day(conn, day)
+                if count:
+                    exported += 1
+                    print(f"Archive : journée {day} exportée ({count} lignes).")
+            day += datetime.timedelta(days=1)
+        return exported
+
+    def load_range(self, start, end, metrics=None):
+        """
+        Charge [start, end[ depuis l'archive. Renvoie un dict de tableaux NumPy
+        ('timestamp' en secondes + une entrée par métrique demandée).
+        """
+        metrics = list(metrics or [m for m in ARCHIVE_COLUMNS if m != "timestamp"])
+        t_start, t_end = _wall_epoch(start), _wall_epoch(end)
+        parts = {name: [] for name in ["timestamp"] + metrics}
+
+        for day_key in sorted(self.index["days"]):
+            info = self.index["days"][day_key]
+            if info["end"] < t_start or info["start"] >= t_end:
+                continue
+            day_dir = os.path.join(self.directory, day_key)
+            blocks = None # Ancienne journée sans table de blocs : tout relire
+            if "blocks" in info:
+                blocks = [i for i, (b_start, b_end) in enumerate(info["blocks"])
+                          if b_end >= t_start and b_start < t_end]
+            timestamps = self._read_column(os.path.join(day_dir, "timestamp.col"), blocks)
+            mask = (timestamps >= t_start) & (timestamps < t_end)
+            parts["timestamp"].append(timestamps[mask])
+            for name in metrics:
+                if name in info["metrics"]:
+                    parts[name].append(self._read_column(os.path.join(day_dir, name + ".col"), blocks)[mask])
+                else: # Journée archivée avant l'ajout de cette métrique
+                    parts[name].append(np.zeros(int(mask.sum())))
+
+        return {name: (np.concatenate(chunks) if chunks else np.empty(0))
+                for name, chunks in parts.items()}
+
+# --- Maintenance de la DB (rétention + vacuum incrémental) ---
+DB_BUSY_TIMEOUT_S = 30        # Attente max si l'autre connexion tient le verrou
+MAINTENANCE_INTERVAL_S = 3600 # 1 fois par heure
+MAINTENANCE_CHUNK_ROWS = 5000 # Lignes supprimées par transaction
+VACUUM_STEP_PAGES = 256       # Pages libérées par pas d'incremental_vacuum
+MAINTENANCE_PAUSE_S = 0.05    # Pause entre deux lots (laisse la main au worker)
+
+def maintenance_pause(stop_event=None):
+    """Pause entre deux lots. Renvoie True si l'arrêt a été demandé entre-temps."""
+    if stop_event is None:
+        time.sleep(MAINTENANCE_PAUSE_S)
+        return False
+    return stop_event.wait(MAINTENANCE_PAUSE_S)
+
+def delete_in_chunks(conn, table, cutoff, chunk_size=MAINTENANCE_CHUNK_ROWS, column="timestamp", stop_event=None):
+    """
+    Supprime les lignes antérieures à 'cutoff' par tranches de clés ('column', indexée),
+    une courte transaction par tranche. Renvoie le nombre de lignes supprimées
+    (s'arrête entre deux tranches si 'stop_event' est levé).
+    """
+    deleted = 0
+    while True:
+        # Borne haute de la prochaine tranche (parcours de l'index sur la colonne)
+        upper = conn.execute(
+            f"SELECT MAX({column}) FROM (SELECT {column} FROM {table} "
+            f"WHERE {column} < ? ORDER BY {column} LIMIT ?)",
+            (cutoff, chunk_size)
+        ).fetchone()[0]
+        if upper is None:
+            return deleted
+        cursor = conn.execute(f"DELETE FROM {table} WHERE {column} <= ?", (upper,))
+        conn.commit()
+        deleted += cursor.rowcount
+        if maintenance_pause(stop_event):
+            return deleted
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES, stop_event=None):
+    """
+    Rend les pages libres au système par petits pas. Renvoie les octets récupérés
+    (s'arrête entre deux pas si 'stop_event' est levé).
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    free_pages = free_before
+    while free_pages > 0:
+        conn.execute(f"PRAGMA incremental_vacuum({step_pages})").fetchall()
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free_pages:
+            break # Plus de progrès possible
+        free_pages = remaining
+        if maintenance_pause(stop_event):
+            break
+    return (free_before - free_pages) * page_size
+
+def convert_to_incremental_vacuum(conn):
+    """
+    Conversion unique d'une ancienne DB en auto_vacuum=INCREMENTAL. Le VACUUM
+    complet garde le verrou d'écriture pendant toute la reconstruction : à
+    appeler AVANT de démarrer la collecte, jamais depuis la maintenance.
+    Renvoie True si une conversion a eu lieu.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    print("Conversion de la DB en auto_vacuum=INCREMENTAL (VACUUM unique, avant la collecte)...")
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+def prepare_database(db_name):
+    """Schéma + conversion éventuelle, par le propriétaire de la collecte avant ses threads."""
+    try:
+        conn = sqlite3.connect(db_name, timeout=DB_BUSY_TIMEOUT_S)
+        init_database(conn)
+        convert_to_incremental_vacuum(conn)
+        conn.close()
+    except Exception as e:
+        print(f"Erreur d'initialisation de la DB : {e}")
+
+def init_database(conn):
+    """
+    Crée (ou met à jour) le schéma. Appelé par la GUI au démarrage ET par le
+    collecteur hors processus, qui peut tourner sans interface.
+    """
+    # Vacuum incrémental (effectif seulement sur une DB neuve,
+    # les anciennes DB sont converties par convert_to_incremental_vacuum)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL : le worker et la maintenance n'attendent pas l'un sur l'autre en lecture
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Créer la table au cas où elle n'existerait pas
+    # AJOUT de fan_rpm INTEGER
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_stats (
+            timestamp DATETIME PRIMARY KEY,
+            cpu_percent REAL,
+            ram_percent REAL,
+            fan_rpm INTEGER
+        )
+    """)
+    
+    # Tenter de mettre à jour l'ancienne table si 'fan_rpm' manque
+    try:
+        conn.execute("ALTER TABLE system_stats ADD COLUMN fan_rpm INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà, c'est normal
+    try:
+        conn.execute("ALTER TABLE system_stats ADD COLUMN gpu_percent REAL DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà, c'est normal
+    try:
+        conn.execute("ALTER TABLE system_stats ADD COLUMN proc_churn REAL DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà, c'est normal
+
+    # Historique par cgroup (v2)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cgroup_stats (
+            timestamp DATETIME,
+            path TEXT,
+            cpu_percent REAL,
+            memory_current INTEGER,
+            memory_max INTEGER,
+            io_read_bps REAL,
+            io_write_bps REAL,
+            PRIMARY KEY (timestamp, path)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cgroup_stats_path ON cgroup_stats (path, timestamp)")
+
+    # Historique de la liste de surveillance (même hors du top N)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS process_watch (
+            timestamp DATETIME,
+            pid INTEGER,
+            create_time REAL,
+            name TEXT,
+            cpu_percent REAL,
+            memory_percent REAL,
+            PRIMARY KEY (timestamp, pid)
+        )
+    """)
+    # Détails mémoire (pour traquer les fuites)
+    for column in ("uss INTEGER", "swap INTEGER", "num_threads INTEGER", "num_fds INTEGER"):
+        try:
+            conn.execute(f"ALTER TABLE process_watch ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass # La colonne existe déjà, c'est normal
+
+    # Cycle de vie des processus (début, fin, durée de vie, pics)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS process_lifecycle (
+            pid INTEGER,
+            create_time REAL,
+            name TEXT,
+            username TEXT,
+            start_time DATETIME,
+            exit_time DATETIME,
+            lifetime_s REAL,
+            peak_cpu REAL,
+            peak_memory REAL,
+            PRIMARY KEY (pid, create_time)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lifecycle_exit ON process_lifecycle (exit_time)")
+    conn.commit()
+
+# --- Enregistrement / rejeu des échantillons ---
+RECORD_FLUSH_EVERY = 10 # Vider le tampon compressé tous les N échantillons
+
+class SampleRecorder:
+    """
+    Enregistre le contenu brut de chaque tick (le dict envoyé dans 'data_queue')
+    dans un fichier gzip en ajout seul : une ligne JSON {"t": epoch, "sample": {...}}.
+    Chaque session ajoute un nouveau membre gzip ; le fichier reste lisible d'un bloc.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+        self.pending = 0
+
+    def record(self, timestamp, sample):
+        line = json.dumps({"t": timestamp.timestamp(), "sample": sample}, separators=(',', ':'))
+        self.file.write(line + "\n")
+        self.pending += 1
+        if self.pending >= RECORD_FLUSH_EVERY:
+            self.file.flush()
+            self.pending = 0
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def read(path):
+        """Relit un enregistrement : génère des tuples (epoch, sample)."""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break # Dernière ligne tronquée (arrêt brutal)
+                    yield record["t"], record["sample"]
+            except (EOFError, gzip.BadGzipFile):
+                pass # Fin de fichier tronquée : garder ce qui a été lu
+
+# --- Ligne de base et anomalies (par métrique) ---
+BASELINE_FILE = "baseline.json"
+BASELINE_METRICS = ("cpu", "ram", "gpu")
+BASELINE_DB_COLUMNS = {"cpu": "cpu_percent", "ram": "ram_percent", "gpu": "gpu_percent"}
+# Décroissance en temps de mesure (et non en nombre d'échantillons) : le poids d'un
+# échantillon vaut 1 - 0.5 ** (durée représentée / demi-vie), quel que soit l'intervalle.
+# Case globale : niveau "récent" de la machine, sur plusieurs heures.
+BASELINE_GLOBAL_HALF_LIFE_S = 6 * 3600
+# Cases horaires : seuls les échantillons de cette heure y entrent (3600 s par jour),
+# une demi-vie de 3 "heures de mesure" couvre donc environ 3 jours. Une charge
+# soutenue inhabituelle n'y devient "normale" qu'après plusieurs jours.
+BASELINE_HOURLY_HALF_LIFE_S = 3 * 3600
+BASELINE_MAX_STEP_S = 60      # Durée max attribuée à un échantillon (trous de collecte)
+BASELINE_MIN_SAMPLES = 300    # Échantillons avant d'utiliser une case (heure) ou d'alerter
+BASELINE_MIN_STD = 2.0        # Écart-type plancher (points de %), évite les z infinis sur une métrique plate
+BASELINE_SEED_DAYS = 7        # Historique relu pour amorcer une ligne de base absente
+BASELINE_SAVE_INTERVAL_S = 300
+BASELINE_FETCH_ROWS = 5000    # Lignes lues par lot lors de l'amorçage
+ANOMALY_Z = 4.0               # Seuil d'alerte par défaut (en écarts-types)
+ANOMALY_RESET_Z = 2.0         # Retour sous ce z : le verrou d'alerte est relâché
+
+class MetricBaseline:
+    """
+    Moyenne et variance mobiles exponentielles (EWMA) d'une métrique, en O(1)
+    par échantillon : une case globale et, optionnellement, une par heure de
+    la journée (une machine chargée la nuit n'est pas anormale la nuit).
+    Chaque case est [moyenne, variance, nombre d'échantillons].
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or {"all": [0.0, 0.0, 0]}
+
+    def _update_bucket(self, key, value, alpha):
+        bucket = self.buckets.setdefault(key, [0.0, 0.0, 0])
+        mean, var, count = bucket
+        # Pendant l'amorçage, moyenne exacte (1/n), puis poids lié à la demi-vie
+        alpha = max(alpha, 1.0 / (count + 1))
+        diff = value - mean
+        incr = alpha * diff
+        bucket[0] = mean + incr
+        bucket[1] = (1 - alpha) * (var + diff * incr)
+        bucket[2] = count + 1
+
+    def update(self, value, hour=None, step_s=1.0):
+        """Intègre un échantillon représentant 'step_s' secondes de mesure."""
+        step_s = min(max(step_s, 0.0), BASELINE_MAX_STEP_S)
+        self._update_bucket("all", value, 1 - 0.5 ** (step_s / BASELINE_GLOBAL_HALF_LIFE_S))
+        if hour is not None:
+            self._update_bucket(str(hour), value, 1 - 0.5 ** (step_s / BASELINE_HOURLY_HALF_LIFE_S))
+
+    def expected(self, hour=None):
+        """(moyenne, écart-type) attendus, ou None si la ligne de base est encore trop jeune."""
+        bucket = self.buckets.get(str(hour)) if hour is not None else None
+        if bucket is None or bucket[2] < BASELINE_MIN_SAMPLES:
+            bucket = self.buckets["all"]
+        if bucket[2] < BASELINE_MIN_SAMPLES:
+            return None
+        return bucket[0], max(bucket[1] ** 0.5, BASELINE_MIN_STD)
+
+class BaselineModel:
+    """Lignes de base de toutes les métriques, persistées dans baseline.json."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.metrics = {metric: MetricBaseline() for metric in BASELINE_METRICS}
+        self.last_save = time.time()
+
+    def is_empty(self):
+        return all(m.buckets["all"][2] == 0 for m in self.metrics.values())
+
+    def observe(self, values, timestamp, hourly=True, step_s=1.0):
+        """
+        Compare chaque valeur à sa ligne de base PUIS l'y intègre
+        ('step_s' : secondes de mesure représentées, en général l'intervalle).
+        Renvoie {métrique: (moyenne, écart-type, z)} pour les lignes de base prêtes.
+        """
+        hour = timestamp.hour if hourly else None
+        result = {}
+        for metric, value in values.items():
+            baseline = self.metrics[metric]
+            expected = baseline.expected(hour)
+            if expected is not None:
+                mean, std = expected
+                result[metric] = (mean, std, (value - mean) / std)
+            baseline.update(value, hour, step_s)
+        return result
+
+    def seed_from_db(self, conn, days=BASELINE_SEED_DAYS, stop_event=None):
+        """
+        Amorce les lignes de base (dont les cases horaires) avec l'historique récent
+        de la DB. Renvoie le nombre de lignes lues, ou None si 'stop_event' a interrompu la lecture.
+        """
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+        columns = ", ".join(BASELINE_DB_COLUMNS[m] for m in BASELINE_METRICS)
+        cursor = conn.execute(
+            f"SELECT (julianday(timestamp) - 2440587.5) * 86400.0, CAST(strftime('%H', timestamp) AS INTEGER), "
+            f"{columns} FROM system_stats WHERE timestamp >= ? ORDER BY timestamp", (since,)
+        )
+        count = 0
+        previous_t = None
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            rows = cursor.fetchmany(BASELINE_FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                # Durée représentée : écart avec la ligne précédente (bornée pour les trous)
+                step_s = 1.0 if previous_t is None else row[0] - previous_t
+                previous_t = row[0]
+                for metric, value in zip(BASELINE_METRICS, row[2:]):
+                    if value is not None:
+                        self.metrics[metric].update(value, row[1], step_s)
+            count += len(rows)
+        return count
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for metric, buckets in data.items():
+                if metric in self.metrics and "all" in buckets:
+                    self.metrics[metric] = MetricBaseline(buckets)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Erreur de lecture de {self.path} : {e}")
+            return False
+
+    def save(self):
+        """Écriture atomique (fichier temporaire puis remplacement)."""
+        self.last_save = time.time()
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({metric: m.buckets for metric, m in self.metrics.items()}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde de {self.path} : {e}")
+
+# --- Réglages partagés GUI / worker ---
+CONFIG_POLL_MS = 2000         # Vérification des modifications externes de config.json
+SETTINGS_SAVE_DELAY_MS = 500  # Anti-rebond avant d'écrire config.json
+# Clés de config.json dont le nom diffère du champ (compatibilité des anciens fichiers)
+SETTINGS_CONFIG_KEYS = {"aggregation_mode": "aggregation"}
+COLLECTOR_MODES = ("thread", "process")
+CONFIG_BOOL_STRINGS = {"true": True, "1": True, "false": False, "0": False}
+
+def parse_config_bool(value):
+    """
+    Booléen de config.json : vrai booléen JSON, 0/1, ou chaîne "true"/"false"/"0"/"1"
+    (fichier édité à la main). Lève ValueError sinon ; bool("false") vaudrait True.
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in CONFIG_BOOL_STRINGS:
+        return CONFIG_BOOL_STRINGS[value.strip().lower()]
+    raise ValueError(value)
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Instantané immuable des réglages utilisés par le worker.
+    La GUI en publie un nouveau à chaque changement (simple affectation
+    d'attribut, atomique) ; le worker le lit une fois par tick, sans verrou
+    et sans appeler Tcl depuis son thread.
+    """
+    cpu_threshold: int = 90
+    ram_threshold: int = 90
+    gpu_threshold: int = 90
+    process_cpu_threshold: int = 50
+    group_cpu_threshold: int = 80
+    cgroup_cpu_threshold: int = 80
+    days_to_keep: int = 7
+    update_interval_ms: int = UPDATE_INTERVAL_MS
+    aggregation_mode: str = "pid"
+    cgroup_root: str = CGROUP_ROOT
+    archive_enabled: bool = True
+    watch_filters: tuple = ()
+    detail_budget_ms: int = DETAIL_BUDGET_MS
+    collector_mode: str = "thread" # "thread" ou "process" (collecteur hors processus)
+    anomaly_alerts: bool = True
+    anomaly_z: float = ANOMALY_Z   # Écarts-types au-dessus de la ligne de base pour alerter
+    baseline_hourly: bool = True   # Une ligne de base par heure de la journée
+
+    def __post_init__(self):
+        # Bornes minimales (un intervalle nul ferait tourner le worker à vide)
+        object.__setattr__(self, "update_interval_ms", max(100, self.update_interval_ms))
+        object.__setattr__(self, "days_to_keep", max(1, self.days_to_keep))
+        object.__setattr__(self, "detail_budget_ms", max(0, self.detail_budget_ms))
+        object.__setattr__(self, "anomaly_z", max(1.0, self.anomaly_z))
+
+    @classmethod
+    def from_config(cls, config):
+        """Construit un instantané depuis config.json (valeurs absentes ou invalides : défaut)."""
+        values = {}
+        for field in fields(cls):
+            key = SETTINGS_CONFIG_KEYS.get(field.name, field.name)
+            if key not in config:
+                continue
+            try:
+                if isinstance(field.default, bool):
+                    values[field.name] = parse_config_bool(config[key])
+                elif isinstance(field.default, int):
+                    values[field.name] = int(config[key])
+                elif isinstance(field.default, float):
+                    values[field.name] = float(config[key])
+                elif isinstance(field.default, tuple):
+                    values[field.name] = tuple(str(v) for v in config[key])
+                else:
+                    values[field.name] = str(config[key])
+            except (TypeError, ValueError):
+                print(f"Valeur invalide pour '{key}' dans config.json, défaut utilisé.")
+        if values.get("aggregation_mode", "pid") not in AGGREGATION_MODES:
+            del values["aggregation_mode"]
+        if values.get("collector_mode", "thread") not in COLLECTOR_MODES:
+            del values["collector_mode"]
+        return cls(**values)
+
+    def to_config(self):
+        """Dict prêt pour json.dump."""
+        return {SETTINGS_CONFIG_KEYS.get(name, name): (list(value) if isinstance(value, tuple) else value)
+                for name, value in asdict(self).items()}
+
+# --- Collecteur (indépendant de Tk) ---
+INDEX_CHUNK_ENTRIES = 300 # Entrées de l'index par message lors d'une resynchronisation
+CMDLINE_EXPORT_LIMIT = 256 # Ligne de commande tronquée dans les messages inter-processus
+
+class Collector:
+    """
+    Collecte, alertes, DB et maintenance, sans aucune dépendance à Tk.
+    Les messages (stats, alertes, rapports) sont transmis via 'emit' et les
+    réglages lus via 'get_settings' : le même code tourne dans un thread de
+    l'application ou dans un processus séparé (voir run_collector_process).
+    """
+
+    def __init__(self, db_name, emit, get_settings, recorder=None):
+        self.db_name = db_name
+        self.db_conn = None
+        self.emit = emit
+        self.get_settings = get_settings
+        self.recorder = recorder
+        self.stop_event = threading.Event()
+
+        # --- Index des processus et détails mémoire ---
+        self.process_index = ProcessIndex()
+        self.detail_collector = ProcessDetailCollector(get_settings().detail_budget_ms)
+        # Hors processus : envoyer les changements de l'index pour la recherche côté GUI
+        self.export_index = False
+        self.resync_requested = None # Callable -> bool (demande d'envoi complet de l'index)
+        self.exported_usage = {}
+        self.exported_details = {} # {clé: date des détails envoyés}
+
+        # --- Verrous d'alerte (pour éviter le spam) ---
+        self.system_alert_triggered = {
+            "cpu": False,
+            "ram": False,
+            "gpu": False
+        }
+        # Dictionnaire pour les processus déjà signalés {pid: "nom"}
+        self.process_alert_triggered = {}
+        # Dictionnaire pour les groupes déjà signalés {clé: "libellé"}
+        self.group_alert_triggered = {}
+        # Ensemble des cgroups déjà signalés {(chemin, "CPU"/"RAM")}
+        self.cgroup_alert_triggered = set()
+        # Métriques en anomalie (z-score au-dessus du seuil)
+        self.anomaly_alert_triggered = set()
+
+        # --- Ligne de base par métrique (chargée/amorcée au début de run()) ---
+        self.baseline = None
+
+        # --- Initialisation GPU NVIDIA ---
+        self.gpu_handle = None
+        global NVIDIA_AVAILABLE 
+        if NVIDIA_AVAILABLE: 
+            try:
+                pynvml.nvmlInit()
+                self.gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(0) 
+                print("Surveillance NVIDIA initialisée.")
+            except Exception as e:
+                print(f"Erreur init pynvml (NVIDIA) : {e}. (Pilote à jour ?)")
+                NVIDIA_AVAILABLE = False 
+        else:
+            print("Bibliothèque pynvml non trouvée. Surveillance GPU NVIDIA désactivée.")
+
+    def stop(self):
+        """Demande l'arrêt des boucles (collecte, maintenance, rejeu)."""
+        self.stop_event.set()
+
+    def close(self):
+        """Libère les ressources (GPU, enregistrement)."""
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        if NVIDIA_AVAILABLE and self.gpu_handle:
+            try:
+                pynvml.nvmlShutdown()
+                print("Surveillance NVIDIA arrêtée.")
+            except Exception as e:
+                print(f"Erreur lors de nvmlShutdown: {e}")
+
+    def emit_index_changes(self, added, removed):
+        """
+        Transmet les changements de l'index (ajouts, retraits, CPU/RAM modifiés,
+        détails mémoire rafraîchis) pour que la GUI d'un autre processus garde
+        une copie interrogeable.
+        Sur demande (GUI qui vient de s'attacher, messages perdus), tout l'index est renvoyé.
+        """
+        def export(entry):
+            row = {k: v for k, v in entry.items() if not k.startswith('_')}
+            row['cmdline'] = row['cmdline'][:CMDLINE_EXPORT_LIMIT]
+            return row
+
+        with self.process_index.lock:
+            entries = self.process_index.entries
+            if self.resync_requested and self.resync_requested():
+                items = list(entries.values())
+                self.exported_usage = {(e['pid'], e['create_time']): (round(e['cpu_percent'], 1), round(e['memory_percent'], 1))
+                                       for e in items}
+                self.exported_details = {} # Tous renvoyés au prochain tick
+                for start in range(0, max(len(items), 1), INDEX_CHUNK_ENTRIES):
+                    self.emit({"index_reset": start == 0,
+                               "index_added": [export(e) for e in items[start:start + INDEX_CHUNK_ENTRIES]]})
+                return
+
+            added_rows = [export(entries[key]) for key in added]
+            removed_keys = []
+            for entry in removed:
+                key = (entry['pid'], entry['create_time'])
+                self.exported_usage.pop(key, None)
+                removed_keys.append(list(key))
+            # N'envoyer que les CPU/RAM qui ont changé (arrondis à 0.1)
+            usage = []
+            for key, entry in entries.items():
+                value = (round(entry['cpu_percent'], 1), round(entry['memory_percent'], 1))
+                if self.exported_usage.get(key) != value:
+                    self.exported_usage[key] = value
+                    usage.append([key[0], key[1], value[0], value[1]])
+
+        # Détails du tick précédent (rafraîchis après le scan), par paquets
+        details = self.detail_collector.export_rows(self.exported_details)
+        self.emit({"index_added": added_rows, "index_removed": removed_keys, "index_usage": usage,
+                   "index_details": details[:INDEX_CHUNK_ENTRIES]})
+        for start in range(INDEX_CHUNK_ENTRIES, len(details), INDEX_CHUNK_ENTRIES):
+            self.emit({"index_added": [], "index_details": details[start:start + INDEX_CHUNK_ENTRIES]})
+
+    def run_maintenance(self):
+        """
+        Archivage, rétention ET vacuum, sur une connexion dédiée.
+        Les suppressions se font par petites tranches pour ne jamais bloquer
+        longtemps les insertions du worker de collecte.
+        """
+        try:
+            conn = sqlite3.connect(self.db_name, timeout=DB_BUSY_TIMEOUT_S)
+        except Exception as e:
+            print(f"Erreur de connexion DB dans la maintenance : {e}")
+            return
+
+        archive = ColumnarArchive()
+
+        while not self.stop_event.is_set():
+            try:
+                settings = self.get_settings()
+                started = time.time()
+                size_before = os.path.getsize(self.db_name)
+
+                # 1. Archiver les journées terminées AVANT de les supprimer
+                if settings.archive_enabled:
+                    try:
+                        archive.export_finished_days(conn, self.stop_event)
+                    except Exception as e:
+                        print(f"Erreur lors de l'archivage : {e}")
+
+                # 2. Rétention par tranches
+                cutoff_date = datetime.datetime.now() - datetime.timedelta(days=settings.days_to_keep)
+                deleted = 0
+                # (Arrêt demandé : chaque étape rend la main entre deux tranches,
+                #  la suite est reprise au prochain démarrage)
+                for table in ("system_stats", "cgroup_stats", "process_watch"):
+                    deleted += delete_in_chunks(conn, table, cutoff_date, stop_event=self.stop_event)
+                # Processus terminés seulement (les vivants ont exit_time NULL)
+                deleted += delete_in_chunks(conn, "process_lifecycle", cutoff_date, column="exit_time",
+                                            stop_event=self.stop_event)
+                if self.stop_event.is_set():
+                    break
+
+                # 3. Rendre l'espace libéré, par petits pas (la conversion des anciennes
+                #    DB en auto_vacuum=INCREMENTAL est faite au démarrage, voir prepare_database)
+                reclaimed = incremental_vacuum(conn, stop_event=self.stop_event)
+                # En mode WAL, le fichier principal ne rétrécit qu'au checkpoint.
+                # PASSIVE : n'attend jamais le worker (TRUNCATE bloquerait ses écritures)
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+                size_after = os.path.getsize(self.db_name)
+
+                report = {
+                    "deleted": deleted,
+                    "reclaimed": max(reclaimed, size_before - size_after),
+                    "duration": time.time() - started
+                }
+                print(f"Nettoyage DB effectué : {deleted} lignes avant {cutoff_date} supprimées, "
+                      f"{report['reclaimed'] / 1e6:.1f} Mo récupérés en {report['duration']:.1f} s")
+                self.emit({"maintenance": report})
+            except Exception as e:
+                print(f"Erreur lors du nettoyage DB : {e}")
+
+            self.stop_event.wait(MAINTENANCE_INTERVAL_S)
+
+        conn.close()
+
+    def run(self):
+        """
+        Le "worker" : collecte, gère la DB, ET vérifie les alertes.
+        S'exécute dans un thread séparé (ou dans le processus collecteur)
+        jusqu'à l'appel de stop().
+        """
+        try:
+            self.db_conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_S)
+            cursor = self.db_conn.cursor()
+            # (Schéma créé/migré avant le démarrage des threads : voir prepare_database)
+        except Exception as e:
+            print(f"Erreur de connexion DB dans le worker : {e}")
+            return 
+
+        self.baseline = BaselineModel(BASELINE_FILE)
+        if not self.baseline.load():
+            # Amorçage long (jusqu'à BASELINE_SEED_DAYS d'historique) : hors du thread de collecte
+            threading.Thread(target=self.seed_baseline, daemon=True).start()
+
+        last_cgroup_time = 0
+        last_scan_time = time.time() # Pour le taux de création de processus
+        first_scan = True
+        current_pids = set() # Pour suivre les processus en vie
+        cgroup_collector = None
+        watch_filters = () # Dernière liste de filtres surveillés analysée
+        watch_terms = []
+        watched_keys = [] # Clés surveillées au tick précédent (prioritaires pour les détails)
+
+        while not self.stop_event.is_set():
+            # Réglages du tick (lecture unique, sans verrou)
+            settings = self.get_settings()
+            try:
+                # --- 1. Collecte des données Système ---
+                cpu = psutil.cpu_percent(interval=None) 
+                ram = psutil.virtual_memory().percent
+                timestamp = datetime.datetime.now()
+
+                # --- 2. Collecte des données GPU (si possible) ---
+                gpu_text = "N/A"
+                gpu_util = 0 
+                if self.gpu_handle: 
+                    try:
+                        util_rates = pynvml.nvmlDeviceGetUtilizationRates(self.gpu_handle)
+                        gpu_util = util_rates.gpu 
+                        gpu_text = f"{gpu_util} %"
+                    except Exception as e:
+                        gpu_text = "Err"
+                        
+                # --- 3. Collecte des données Ventilateur (si possible) ---
+                fan_text = "N/A"
+                fan_rpm = 0 
+                try:
+                    fans = psutil.sensors_fans()
+                    if fans:
+                        first_fan_key = list(fans.keys())[0]
+                        fan_rpm = fans[first_fan_key][0].current
+                        fan_text = f"{fan_rpm} RPM"
+                except Exception as e:
+                    pass 
+
+                # --- 4. Vérification des Alertes Système ---
+                # Lire les seuils depuis l'instantané des réglages
+                cpu_alert_level = settings.cpu_threshold
+                ram_alert_level = settings.ram_threshold
+                gpu_alert_level = settings.gpu_threshold
+                
+                self.check_system_alerts(cpu, ram, gpu_util, cpu_alert_level, ram_alert_level, gpu_alert_level)
+
+                # --- 4a. Écart à la ligne de base (z-score) ---
+                baseline_bands = self.check_anomalies({"cpu": cpu, "ram": ram, "gpu": gpu_util}, timestamp, settings)
+                    
+                # --- 5. Collecte des Processus ET Vérification Alertes Processus ---
+                # (Re)créer le collecteur cgroup si la racine a changé
+                if cgroup_collector is None or cgroup_collector.root != settings.cgroup_root:
+                    cgroup_collector = CgroupCollector(settings.cgroup_root)
+                    if not cgroup_collector.is_available():
+                        print(f"cgroup v2 non disponible sous {settings.cgroup_root}.")
+                cgroup_available = cgroup_collector.is_available()
+
+                processes = []
+                current_pids.clear()
+                proc_alert_level = settings.process_cpu_threshold
+                
+                scanned = {} # {(pid, create_time): pinfo} pour l'index de recherche
+                proc_objects = {} # {(pid, create_time): psutil.Process} pour les détails
+                for proc in psutil.process_iter(['pid', 'ppid', 'name', 'username', 'create_time', 'cpu_percent', 'memory_percent']):
+                    try:
+                        pinfo = proc.info
+                        current_pids.add(pinfo['pid']) # Garder une trace des PID en vie
+                        if cgroup_available:
+                            pinfo['cgroup'] = cgroup_collector.cgroup_of(pinfo['pid'])
+
+                        # La ligne de commande (coûteuse) n'est lue que pour les nouveaux processus
+                        key = (pinfo['pid'], pinfo['create_time'])
+                        if key not in self.process_index:
+                            try:
+                                pinfo['cmdline'] = " ".join(proc.cmdline())
+                            except (psutil.AccessDenied, psutil.ZombieProcess):
+                                pinfo['cmdline'] = ""
+                        scanned[key] = pinfo
+                        proc_objects[key] = proc
+
+                        # 'cpu_percent' peut être None au premier appel
+                        if pinfo['cpu_percent'] is not None:
+                            processes.append(pinfo)
+                                    
+                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                        pass # Le processus est mort pendant l'itération
+                
+                added, removed = self.process_index.update(scanned)
+                if self.export_index:
+                    self.emit_index_changes(added, removed)
+
+                # --- 5-bis. Cycle de vie ET processus créés par seconde ---
+                scan_time = time.time()
+                elapsed = max(scan_time - last_scan_time, 1e-3)
+                # Nouveaux (pid, create_time) depuis le scan précédent : des processus,
+                # pas des threads (le compteur 'processes' de /proc/stat compte les deux)
+                churn = 0.0 if first_scan else len(added) / elapsed
+                last_scan_time = scan_time
+                self.record_lifecycle(cursor, timestamp, added, removed, first_scan)
+                first_scan = False
+                self.check_process_alerts(processes, proc_alert_level, current_pids)
+                if cgroup_available:
+                    cgroup_collector.prune(current_pids)
+
+                # Trier et prendre le TOP N pour affichage
+                top_processes = sorted(processes, key=lambda p: p['cpu_percent'], reverse=True)[:TOP_PROCESS_COUNT]
+
+                # --- 5a. Détails coûteux, dans le budget (top CPU, top RAM, surveillés, puis rotation) ---
+                top_memory = sorted(processes, key=lambda p: p['memory_percent'] or 0.0, reverse=True)[:DETAIL_PRIORITY_COUNT]
+                priority_keys = [(p['pid'], p['create_time']) for p in top_processes[:DETAIL_PRIORITY_COUNT] + top_memory]
+                self.detail_collector.budget_ms = settings.detail_budget_ms
+                self.detail_collector.refresh(proc_objects, priority_keys + watched_keys)
+                for pinfo in top_processes:
+                    pinfo.update(self.detail_collector.details((pinfo['pid'], pinfo['create_time'])) or {})
+
+                # --- 5b. Regroupement (arbre / nom / utilisateur) ET Alertes Groupes ---
+                mode = settings.aggregation_mode
+                if mode == "cgroup" and not cgroup_available:
+                    mode = "pid"
+                top_groups = []
+                if mode != "pid":
+                    groups = build_process_groups(processes, mode)
+                    top_groups = groups[:TOP_PROCESS_COUNT]
+                    self.check_group_alerts(groups, settings.group_cpu_threshold)
+                elif self.group_alert_triggered:
+                    self.group_alert_triggered.clear()
+
+                # --- 6 & 7. Enregistrer, mettre dans la file ET insérer dans la DB ---
+                self.publish_sample(cursor, timestamp, {
+                    "cpu": cpu, "ram": ram, "processes": top_processes,
+                    "mode": mode, "groups": top_groups,
+                    "fan_text": fan_text, "fan_rpm": fan_rpm,
+                    "gpu_text": gpu_text, "gpu_util": gpu_util,
+                    "churn": round(churn, 2),
+                    "baseline": baseline_bands
+                })
+
+                # --- 7a. Liste de surveillance (processus filtrés, même hors top N) ---
+                if settings.watch_filters != watch_filters:
+                    watch_filters = settings.watch_filters
+                    watch_terms = []
+                    for text in watch_filters:
+                        try:
+                            watch_terms.append(parse_process_filter(text))
+                        except (re.error, ValueError) as e:
+                            print(f"Filtre de surveillance ignoré '{text}' : {e}")
+                if not watch_terms:
+                    watched_keys = []
+                else:
+                    try:
+                        watched = {}
+                        for terms in watch_terms:
+                            for entry in self.process_index.search(terms, WATCH_RESULT_LIMIT):
+                                watched[entry['pid']] = entry
+                        watched_keys = [(e['pid'], e['create_time']) for e in watched.values()]
+                        rows = []
+                        for e in watched.values():
+                            details = self.detail_collector.details((e['pid'], e['create_time'])) or {}
+                            rows.append((timestamp, e['pid'], e['create_time'], e['name'], e['cpu_percent'], e['memory_percent'],
+                                         details.get('uss'), details.get('swap'), details.get('num_threads'), details.get('num_fds')))
+                        cursor.executemany(
+                            "INSERT OR REPLACE INTO process_watch (timestamp, pid, create_time, name, cpu_percent, memory_percent, uss, swap, num_threads, num_fds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            rows
+                        )
+                        self.db_conn.commit()
+                    except Exception as e:
+                        print(f"Erreur lors de l'enregistrement de la surveillance : {e}")
+
+                # --- 7b. Collecte, alertes ET historique des cgroups ---
+                current_time = time.time()
+                if cgroup_available and current_time - last_cgroup_time >= CGROUP_INTERVAL_S:
+                    last_cgroup_time = current_time
+                    try:
+                        cgroups = cgroup_collector.scan()
+                        self.check_cgroup_alerts(cgroups, settings.cgroup_cpu_threshold, ram_alert_level)
+                        cursor.executemany(
+                            "INSERT OR REPLACE INTO cgroup_stats (timestamp, path, cpu_percent, memory_current, memory_max, io_read_bps, io_write_bps) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(timestamp, c['path'], c['cpu_percent'], c['memory_current'], c['memory_max'],
+                              c['io_read_bps'], c['io_write_bps']) for c in cgroups if c['cpu_percent'] is not None]
+                        )
+                        self.db_conn.commit()
+                    except Exception as e:
+                        print(f"Erreur lors de la collecte cgroup : {e}")
+
+                # Attendre avant la prochaine boucle (interrompu par stop())
+                self.stop_event.wait(settings.update_interval_ms / 1000.0)
+
+            except Exception as e:
+                print(f"Erreur dans le worker : {e}")
+                self.stop_event.wait(settings.update_interval_ms / 1000.0)
+
+        self.baseline.save()
+        self.db_conn.close()
+
+    def seed_baseline(self):
+        """
+        Amorce une ligne de base neuve depuis la DB (connexion dédiée), puis la
+        substitue à celle du worker. En attendant, celui-ci collecte normalement
+        (sans alerte d'anomalie tant que sa ligne de base est trop jeune).
+        """
+        try:
+            conn = sqlite3.connect(self.db_name, timeout=DB_BUSY_TIMEOUT_S)
+            try:
+                seeded = BaselineModel(BASELINE_FILE)
+                count = seeded.seed_from_db(conn, stop_event=self.stop_event)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Erreur lors de l'amorçage de la ligne de base : {e}")
+            return
+        if count is None:
+            return # Arrêt demandé pendant l'amorçage
+        self.baseline = seeded # Simple affectation d'attribut (atomique)
+        print(f"Ligne de base amorcée avec {count} échantillons de l'historique.")
+
+    def record_lifecycle(self, cursor, timestamp, added, removed, first_scan=False):
+        """
+        Débuts (ligne ouverte) et fins (durée de vie, pics CPU/RAM) des processus
+        dans process_lifecycle, d'après la différence de l'index entre deux scans.
+        """
+        entries = self.process_index.entries # Lecture sans verrou : ce thread est le seul écrivain
+        try:
+            if first_scan:
+                # Processus terminés pendant l'arrêt du collecteur : fin constatée maintenant
+                open_rows = cursor.execute(
+                    "SELECT pid, create_time FROM process_lifecycle WHERE exit_time IS NULL"
+                ).fetchall()
+                cursor.executemany(
+                    "UPDATE process_lifecycle SET exit_time = ? WHERE pid = ? AND create_time = ?",
+                    [(timestamp, pid, create_time) for pid, create_time in open_rows
+                     if (pid, create_time) not in self.process_index]
+                )
+
+            starts = []
+            for key in added:
+                entry = entries[key]
+                start_time = datetime.datetime.fromtimestamp(entry['create_time']) if entry['create_time'] else None
+                starts.append((entry['pid'], entry['create_time'], entry['name'], entry['username'], start_time))
+            cursor.executemany(
+                "INSERT OR IGNORE INTO process_lifecycle (pid, create_time, name, username, start_time) VALUES (?, ?, ?, ?, ?)",
+                starts
+            )
+
+            exit_epoch = timestamp.timestamp()
+            cursor.executemany(
+                "UPDATE process_lifecycle SET exit_time = ?, lifetime_s = ?, peak_cpu = ?, peak_memory = ? WHERE pid = ? AND create_time = ?",
+                [(timestamp, exit_epoch - entry['create_time'] if entry['create_time'] else None,
+                  entry['_peak_cpu'], entry['_peak_memory'], entry['pid'], entry['create_time'])
+                 for entry in removed]
+            )
+            self.db_conn.commit()
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement du cycle de vie : {e}")
+
+    def check_anomalies(self, values, timestamp, settings, step_s=None):
+        """
+        Alerte (avec verrou) quand une métrique dépasse sa ligne de base de plus
+        de 'anomaly_z' écarts-types. Seuls les dépassements vers le haut alertent.
+        Renvoie {métrique: [moyenne, écart-type]} pour la bande du graphique.
+        """
+        if step_s is None:
+            step_s = settings.update_interval_ms / 1000.0
+        observed = self.baseline.observe(values, timestamp, settings.baseline_hourly, step_s)
+        bands = {}
+        for metric, (mean, std, z) in observed.items():
+            bands[metric] = [round(mean, 2), round(std, 2)]
+            if not settings.anomaly_alerts:
+                continue
+            if z > settings.anomaly_z and metric not in self.anomaly_alert_triggered:
+                self.anomaly_alert_triggered.add(metric)
+                self.emit({
+                    "alert": "anomaly",
+                    "type": metric.upper(),
+                    "value": values[metric],
+                    "mean": mean,
+                    "z": z
+                })
+            elif z < ANOMALY_RESET_Z and metric in self.anomaly_alert_triggered:
+                self.anomaly_alert_triggered.discard(metric)
+
+        if self.baseline.path and time.time() - self.baseline.last_save >= BASELINE_SAVE_INTERVAL_S:
+            self.baseline.save()
+        return bands
+
+    def check_system_alerts(self, cpu, ram, gpu_util, cpu_alert_level, ram_alert_level, gpu_alert_level):
+        """Alertes CPU/RAM/GPU avec verrou (partagé entre collecte live et rejeu)."""
+        # Définir des seuils de "retour à la normale" (pour réinitialiser l'alerte)
+        cpu_reset_level = cpu_alert_level - 10
+        ram_reset_level = ram_alert_level - 10
+        gpu_reset_level = gpu_alert_level - 10
+        
+        # Logique de "verrou" (latching)
+        if cpu > cpu_alert_level and not self.system_alert_triggered["cpu"]:
+            self.system_alert_triggered["cpu"] = True
+            self.emit({"alert": "system", "type": "CPU", "value": cpu})
+        elif cpu < cpu_reset_level and self.system_alert_triggered["cpu"]:
+            self.system_alert_triggered["cpu"] = False # Réinitialiser le verrou
+
+        if ram > ram_alert_level and not self.system_alert_triggered["ram"]:
+            self.system_alert_triggered["ram"] = True
+            self.emit({"alert": "system", "type": "RAM", "value": ram})
+        elif ram < ram_reset_level and self.system_alert_triggered["ram"]:
+            self.system_alert_triggered["ram"] = False
+
+        if gpu_util > gpu_alert_level and not self.system_alert_triggered["gpu"]:
+            self.system_alert_triggered["gpu"] = True
+            self.emit({"alert": "system", "type": "GPU", "value": gpu_util})
+        elif gpu_util < gpu_reset_level and self.system_alert_triggered["gpu"]:
+            self.system_alert_triggered["gpu"] = False
+
+    def check_process_alerts(self, processes, proc_alert_level, live_pids):
+        """Alerte une seule fois par PID trop gourmand, puis oublie les PID morts."""
+        for pinfo in processes:
+            if pinfo['cpu_percent'] > proc_alert_level:
+                pid = pinfo['pid']
+                # Si le PID n'est pas déjà dans notre liste d'alerte...
+                if pid not in self.process_alert_triggered:
+                    self.process_alert_triggered[pid] = pinfo['name'] # ...on l'ajoute...
+                    # ...et on envoie une alerte
+                    self.emit({
+                        "alert": "process", 
+                        "name": pinfo['name'], 
+                        "pid": pid, 
+                        "value": pinfo['cpu_percent']
+                    })
+
+        # Nettoyer la liste des alertes (retirer les processus morts)
+        triggered_pids = list(self.process_alert_triggered.keys())
+        for pid in triggered_pids:
+            if pid not in live_pids:
+                del self.process_alert_triggered[pid]
+
+    def publish_sample(self, cursor, timestamp, sample):
+        """
+        Fin du pipeline d'un tick : enregistrement (si actif), file GUI, puis DB.
+        Utilisé par la collecte live ET par le rejeu.
+        """
+        if self.recorder:
+            try:
+                self.recorder.record(timestamp, sample)
+            except Exception as e:
+                print(f"Erreur d'enregistrement : {e}")
+                self.recorder = None
+
+        # --- 6. Mettre les données STATS dans la file ---
+        self.emit(sample)
+
+        # --- 7. Insérer dans la DB ---
+        try:
+            cursor.execute("INSERT OR REPLACE INTO system_stats (timestamp, cpu_percent, ram_percent, fan_rpm, gpu_percent, proc_churn) VALUES (?, ?, ?, ?, ?, ?)",
+                           (timestamp, sample['cpu'], sample['ram'], sample['fan_rpm'], sample['gpu_util'], sample.get('churn', 0)))
+            cursor.connection.commit()
+        except Exception as e:
+            print(f"Erreur d'insertion DB : {e}")
+
+    def replay(self, replay_file, speed):
+        """
+        Rejoue un enregistrement dans le même pipeline que la collecte live
+        (alertes, file GUI, DB). 'speed' = 1, 10... ou 0 pour "aussi vite que possible" :
+        dans ce cas le rejeu sert aussi de benchmark de débit.
+        """
+        try:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_S)
+            cursor = conn.cursor()
+        except Exception as e:
+            print(f"Erreur de connexion DB dans le rejeu : {e}")
+            return
+
+        # Ligne de base propre au rejeu (jamais sauvegardée, ne pollue pas celle du live)
+        self.baseline = BaselineModel()
+
+        started = time.perf_counter()
+        first_t = None
+        previous_t = None
+        count = 0
+
+        for t, sample in SampleRecorder.read(replay_file):
+            if self.stop_event.is_set():
+                break
+            # Respecter le rythme d'origine (divisé par 'speed')
+            if first_t is None:
+                first_t = t
+            if speed > 0:
+                delay = (t - first_t) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    self.stop_event.wait(delay)
+
+            settings = self.get_settings()
+            try:
+                self.check_system_alerts(sample['cpu'], sample['ram'], sample.get('gpu_util', 0),
+                                         settings.cpu_threshold, settings.ram_threshold, settings.gpu_threshold)
+                sample['baseline'] = self.check_anomalies(
+                    {"cpu": sample['cpu'], "ram": sample['ram'], "gpu": sample.get('gpu_util', 0)},
+                    datetime.datetime.fromtimestamp(t), settings,
+                    step_s=None if previous_t is None else t - previous_t)
+                previous_t = t
+                processes = sample.get('processes', [])
+                self.check_process_alerts(processes, settings.process_cpu_threshold, {p['pid'] for p in processes})
+                if sample.get('groups'):
+                    self.check_group_alerts(sample['groups'], settings.group_cpu_threshold)
+                self.publish_sample(cursor, datetime.datetime.fromtimestamp(t), sample)
+                count += 1
+            except Exception as e:
+                print(f"Erreur dans le rejeu : {e}")
+
+        elapsed = time.perf_counter() - started
+        conn.close()
+        print(f"Rejeu terminé (collecte + alertes + DB) : {count} échantillons en {elapsed:.2f} s "
+              f"({count / elapsed if elapsed else 0:.0f} éch./s)")
+        self.emit({"replay_done": {"count": count, "started": started}})
+
+    def check_group_alerts(self, groups, group_alert_level):
+        """Alerte (avec verrou) si un groupe de processus dépasse le seuil."""
+        group_reset_level = group_alert_level - 10
+        live_keys = set()
+
+        for group in groups:
+            key = group['key']
+            live_keys.add(key)
+            if group['cpu_percent'] > group_alert_level and key not in self.group_alert_triggered:
+                self.group_alert_triggered[key] = group['label']
+                self.emit({
+                    "alert": "group",
+                    "name": group['label'],
+                    "count": group['count'],
+                    "value": group['cpu_percent']
+                })
+            elif group['cpu_percent'] < group_reset_level and key in self.group_alert_triggered:
+                del self.group_alert_triggered[key]
+
+        # Retirer les groupes disparus
+        for key in list(self.group_alert_triggered.keys()):
+            if key not in live_keys:
+                del self.group_alert_triggered[key]
+
+    def check_cgroup_alerts(self, cgroups, cpu_alert_level, ram_alert_level):
+        """
+        Alerte (avec verrou) si un cgroup dépasse le seuil CPU (% machine)
+        ou le seuil RAM (% de sa limite memory.max).
+        """
+        live_keys = set()
+        for cgroup in cgroups:
+            checks = (
+                ("CPU", cgroup['cpu_percent'], cpu_alert_level),
+                ("RAM", cgroup['memory_percent'], ram_alert_level),
+            )
+            for kind, value, alert_level in checks:
+                if value is None:
+                    continue
+                key = (cgroup['path'], kind)
+                live_keys.add(key)
+                if value > alert_level and key not in self.cgroup_alert_triggered:
+                    self.cgroup_alert_triggered.add(key)
+                    self.emit({
+                        "alert": "cgroup",
+                        "type": kind,
+                        "name": cgroup['path'],
+                        "value": value
+                    })
+                elif value < alert_level - 10 and key in self.cgroup_alert_triggered:
+                    self.cgroup_alert_triggered.discard(key)
+
+        # Retirer les cgroups disparus
+        self.cgroup_alert_triggered &= live_keys
+
+# --- Rapport hors ligne (sans affichage) ---
+REPORT_CHUNK_ROWS = 50000     # Lignes lues par lot : mémoire bornée quelle que soit la taille de la DB
+REPORT_METRICS = ("cpu", "ram", "gpu", "churn")
+REPORT_PERCENT_METRICS = ("cpu", "ram", "gpu")
+REPORT_DB_COLUMNS = ("cpu_percent", "ram_percent", "gpu_percent", "proc_churn")
+REPORT_HIST_BINS = 1000       # Histogramme 0-100 % par pas de 0.1 (percentiles en flux)
+REPORT_PERCENTILES = (50, 90, 95, 99)
+REPORT_WINDOW_S = 300         # Fenêtres de 5 min (pics et courbe du rapport)
+REPORT_MAX_GAP_S = 60         # Au-delà, l'écart entre deux points est un arrêt, pas du temps mesuré
+REPORT_TOP_COUNT = 10
+METRIC_LABELS = {"cpu": "CPU", "ram": "RAM", "gpu": "GPU", "churn": "Processus/s"}
+
+class ReportAccumulator:
+    """
+    Agrégats calculés par lots (tableaux NumPy) sans garder les lignes :
+    histogrammes pour les percentiles, temps au-dessus des seuils, maximum
+    daté, et moyennes par fenêtre de REPORT_WINDOW_S secondes.
+    Les temps sont en secondes "heure murale" (comme _wall_epoch).
+    """
+
+    def __init__(self, thresholds):
+        self.thresholds = thresholds # {métrique: seuil en %}
+        self.count = 0
+        self.first_t = None
+        self.last_t = None
+        self.measured_s = 0.0
+        self.hist = {m: np.zeros(REPORT_HIST_BINS, dtype=np.int64) for m in REPORT_PERCENT_METRICS}
+        self.sums = {m: 0.0 for m in REPORT_METRICS}
+        self.counts = {m: 0 for m in REPORT_METRICS}
+        self.peaks = {m: (None, None) for m in REPORT_METRICS} # (valeur, t)
+        self.above_s = {m: 0.0 for m in thresholds}
+        self.windows = {} # {n° de fenêtre: [points, somme cpu, ram, gpu, churn]}
+
+    def add(self, t, columns):
+        """Ajoute un lot : 't' (secondes) et {métrique: valeurs}, NaN pour les valeurs absentes."""
+        if not len(t):
+            return
+        # Durée représentée par chaque point : écart avec le précédent (les trous ne comptent pas)
+        previous = np.concatenate(([t[0] if self.last_t is None else self.last_t], t[:-1]))
+        dt = t - previous
+        dt[(dt < 0) | (dt > REPORT_MAX_GAP_S)] = 0.0
+        self.measured_s += float(dt.sum())
+        if self.first_t is None:
+            self.first_t = float(t[0])
+        self.last_t = float(t[-1])
+        self.count += len(t)
+
+        for metric, values in columns.items():
+            valid = ~np.isnan(values)
+            v = values[valid]
+            if not len(v):
+                continue
+            self.sums[metric] += float(v.sum())
+            self.counts[metric] += len(v)
+            i = int(np.argmax(v))
+            if self.peaks[metric][0] is None or v[i] > self.peaks[metric][0]:
+                self.peaks[metric] = (float(v[i]), float(t[valid][i]))
+            if metric in self.hist:
+                # (+1e-6 : 0.7 * 10 doit tomber dans la case 7, pas 6)
+                bins = np.clip((v * (REPORT_HIST_BINS / 100.0) + 1e-6).astype(np.int64), 0, REPORT_HIST_BINS - 1)
+                self.hist[metric] += np.bincount(bins, minlength=REPORT_HIST_BINS)
+            if metric in self.thresholds:
+                self.above_s[metric] += float(dt[valid][v > self.thresholds[metric]].sum())
+
+        ids = (t // REPORT_WINDOW_S).astype(np.int64)
+        window_ids, inverse = np.unique(ids, return_inverse=True)
+        window_sums = [np.bincount(inverse, minlength=len(window_ids))]
+        window_sums += [np.bincount(inverse, weights=np.nan_to_num(columns[m]), minlength=len(window_ids))
+                        for m in REPORT_METRICS]
+        for i, window_id in enumerate(window_ids.tolist()):
+            acc = self.windows.setdefault(window_id, [0] * (1 + len(REPORT_METRICS)))
+            for j, sums in enumerate(window_sums):
+                acc[j] += sums[i]
+
+    def mean(self, metric):
+        return self.sums[metric] / self.counts[metric] if self.counts[metric] else None
+
+    def percentile(self, metric, q):
+        """Percentile à 0.1 % près (borne basse de la case de l'histogramme)."""
+        hist = self.hist[metric]
+        total = hist.sum()
+        if not total:
+            return None
+        index = int(np.searchsorted(np.cumsum(hist), q / 100.0 * total))
+        return index * 100.0 / REPORT_HIST_BINS
+
+    def window_series(self):
+        """(début de fenêtre en secondes, {métrique: moyenne}) triés dans le temps."""
+        window_ids = sorted(self.windows)
+        starts = np.array(window_ids, dtype=np.float64) * REPORT_WINDOW_S
+        acc = np.array([self.windows[w] for w in window_ids], dtype=np.float64).reshape(-1, 1 + len(REPORT_METRICS))
+        points = np.maximum(acc[:, 0], 1)
+        return starts, {m: acc[:, j + 1] / points for j, m in enumerate(REPORT_METRICS)}
+
+def _from_wall_epoch(seconds):
+    """Inverse de _wall_epoch."""
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=seconds)
+
+def _report_query(conn, query, params):
+    """Requête optionnelle du rapport : table absente (ancienne DB) -> aucune ligne."""
+    try:
+        return conn.execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        return []
+
+def _html_table(headers, rows):
+    head = "".join(f"<th>{html.escape(str(h))}</th>" for h in headers)
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(str(c))}</td>" for c in row) + "</tr>" for row in rows)
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+def _format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours} h {rest // 60:02d} min"
+
+def generate_report(db_name, out_path, days=7, config_file='config.json', archive_dir=ARCHIVE_DIR):
+    """
+    Rapport des 'days' derniers jours : HTML autonome (image PNG intégrée en base64)
+    plus le PNG seul à côté. La DB est lue par lots (en lecture seule), complétée
+    par l'archive colonnaire pour la période déjà purgée de la DB.
+    """
+    settings, _ = read_settings_file(config_file)
+    thresholds = {"cpu": settings.cpu_threshold, "ram": settings.ram_threshold, "gpu": settings.gpu_threshold}
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(days=days)
+    acc = ReportAccumulator(thresholds)
+
+    try:
+        conn = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True)
+        db_start = conn.execute("SELECT MIN(timestamp) FROM system_stats").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Impossible de lire la base '{db_name}' : {e}")
+        return None
+    db_start = datetime.datetime.fromisoformat(str(db_start)) if db_start else end
+
+    # 1. Période purgée de la DB : archive, une journée à la fois
+    archive = ColumnarArchive(archive_dir)
+    archive_end = min(db_start, end)
+    day = start.date()
+    while datetime.datetime.combine(day, datetime.time()) < archive_end:
+        day_start = max(start, datetime.datetime.combine(day, datetime.time()))
+        day_end = min(archive_end, datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()))
+        if archive.has_day(day):
+            data = archive.load_range(day_start, day_end)
+            acc.add(data["timestamp"], {m: data[column] for m, column in zip(REPORT_METRICS, REPORT_DB_COLUMNS)})
+        day += datetime.timedelta(days=1)
+
+    # 2. DB, par lots (conversion en secondes faite par SQLite)
+    cursor = conn.execute(
+        f"SELECT (julianday(timestamp) - 2440587.5) * 86400.0, {', '.join(REPORT_DB_COLUMNS)} "
+        "FROM system_stats WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+        (max(start, db_start), end)
+    )
+    while True:
+        rows = cursor.fetchmany(REPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        data = np.array(rows, dtype=np.float64) # NULL -> NaN
+        acc.add(data[:, 0], {m: data[:, i + 1] for i, m in enumerate(REPORT_METRICS)})
+
+    if not acc.count:
+        conn.close()
+        print(f"Aucune donnée entre {start:%Y-%m-%d %H:%M} et {end:%Y-%m-%d %H:%M}.")
+        return None
+
+    # 3. Résumé par métrique
+    summary_rows = []
+    for metric in REPORT_METRICS:
+        mean = acc.mean(metric)
+        if mean is None:
+            continue
+        peak, peak_t = acc.peaks[metric]
+        row = [METRIC_LABELS[metric], f"{mean:.1f}"]
+        for q in REPORT_PERCENTILES:
+            value = acc.percentile(metric, q) if metric in acc.hist else None
+            row.append("-" if value is None else f"{value:.1f}")
+        row.append(f"{peak:.1f} ({_from_wall_epoch(peak_t):%d/%m %H:%M})")
+        if metric in thresholds:
+            share = 100.0 * acc.above_s[metric] / acc.measured_s if acc.measured_s else 0.0
+            row.append(f"> {thresholds[metric]} % : {_format_duration(acc.above_s[metric])} ({share:.1f} %)")
+        else:
+            row.append("-")
+        summary_rows.append(row)
+
+    # 4. Fenêtres de 5 min les plus chargées
+    starts, series = acc.window_series()
+    top = np.argsort(series["cpu"])[::-1][:REPORT_TOP_COUNT]
+    peak_rows = [[f"{_from_wall_epoch(starts[i]):%Y-%m-%d %H:%M}", f"{series['cpu'][i]:.1f}",
+                  f"{series['ram'][i]:.1f}", f"{series['churn'][i]:.1f}"] for i in top]
+
+    # 5. Processus (si enregistrés)
+    period = (start, end)
+    launched = _report_query(conn,
+        "SELECT name, COUNT(*), MAX(peak_cpu), AVG(lifetime_s) FROM process_lifecycle "
+        "WHERE start_time >= ? AND start_time < ? GROUP BY name ORDER BY COUNT(*) DESC LIMIT ?",
+        period + (REPORT_TOP_COUNT,))
+    hungry = _report_query(conn,
+        "SELECT name, COUNT(*), MAX(peak_cpu), MAX(peak_memory) FROM process_lifecycle "
+        "WHERE start_time >= ? AND start_time < ? AND peak_cpu IS NOT NULL GROUP BY name "
+        "ORDER BY MAX(peak_cpu) DESC LIMIT ?",
+        period + (REPORT_TOP_COUNT,))
+    watched = _report_query(conn,
+        "SELECT name, AVG(cpu_percent), MAX(cpu_percent), MAX(memory_percent), MAX(uss) FROM process_watch "
+        "WHERE timestamp >= ? AND timestamp < ? GROUP BY name ORDER BY AVG(cpu_percent) DESC LIMIT ?",
+        period + (REPORT_TOP_COUNT,))
+    conn.close()
+
+    # 6. Graphique (backend Agg : aucun affichage nécessaire)
+    fig = Figure(figsize=(10, 6), dpi=100)
+    FigureCanvasAgg(fig)
+    ax_time, ax_hist = fig.subplots(2, 1, gridspec_kw={"height_ratios": [2, 1]})
+    times = [_from_wall_epoch(t) for t in starts]
+    for metric, color in (("cpu", 'blue'), ("ram", 'orange'), ("gpu", 'purple')):
+        if not acc.counts[metric]:
+            continue
+        ax_time.plot(times, series[metric], label=f"{METRIC_LABELS[metric]} %", color=color, linewidth=1)
+    ax_time.set_ylim(0, 100)
+    ax_time.set_ylabel("% (moyenne sur 5 min)")
+    ax_churn = ax_time.twinx()
+    ax_churn.plot(times, series["churn"], label="Processus/s", color='red', linewidth=0.8, linestyle='--')
+    ax_churn.set_ylabel("proc/s", color='red')
+    ax_churn.set_ylim(bottom=0)
+    lines, labels = ax_time.get_legend_handles_labels()
+    lines2, labels2 = ax_churn.get_legend_handles_labels()
+    ax_time.legend(lines + lines2, labels + labels2, loc='upper left', fontsize='small')
+    ax_time.grid(True, linestyle=':', alpha=0.6)
+    edges = np.linspace(0, 100, 101) # Affichage par pas de 1 %
+    for metric, color in (("cpu", 'blue'), ("ram", 'orange'), ("gpu", 'purple')):
+        hist = acc.hist[metric].reshape(100, -1).sum(axis=1)
+        if hist.sum():
+            ax_hist.stairs(100.0 * hist / hist.sum(), edges, color=color, label=METRIC_LABELS[metric])
+    ax_hist.set_xlabel("% d'utilisation")
+    ax_hist.set_ylabel("% du temps")
+    ax_hist.legend(fontsize='small')
+    fig.tight_layout()
+
+    png_path = os.path.splitext(out_path)[0] + ".png"
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    png = buffer.getvalue()
+    with open(png_path, 'wb') as f:
+        f.write(png)
+
+    # 7. HTML autonome
+    sections = [
+        f"<h1>Rapport du moniteur de processus</h1>"
+        f"<p>Du {_from_wall_epoch(acc.first_t):%Y-%m-%d %H:%M} au {_from_wall_epoch(acc.last_t):%Y-%m-%d %H:%M} : "
+        f"{acc.count} mesures, {_format_duration(acc.measured_s)} de collecte.</p>",
+        f'<img src="data:image/png;base64,{base64.b64encode(png).decode()}" alt="Graphique">',
+        "<h2>Résumé</h2>" + _html_table(
+            ["Métrique", "Moyenne"] + [f"p{q}" for q in REPORT_PERCENTILES] + ["Maximum", "Au-dessus du seuil"],
+            summary_rows),
+        "<h2>Périodes de 5 min les plus chargées (CPU)</h2>" + _html_table(
+            ["Début", "CPU %", "RAM %", "Processus/s"], peak_rows),
+    ]
+    if launched:
+        sections.append("<h2>Programmes les plus lancés</h2>" + _html_table(
+            ["Nom", "Lancements", "Pic CPU %", "Durée de vie moyenne (s)"],
+            [(n, c, f"{p or 0:.1f}", f"{l:.1f}" if l is not None else "-") for n, c, p, l in launched]))
+    if hungry:
+        sections.append("<h2>Pics CPU par programme</h2>" + _html_table(
+            ["Nom", "Processus", "Pic CPU %", "Pic RAM %"],
+            [(n, c, f"{p:.1f}", f"{m or 0:.1f}") for n, c, p, m in hungry]))
+    if watched:
+        sections.append("<h2>Processus surveillés</h2>" + _html_table(
+            ["Nom", "CPU moyen %", "CPU max %", "RAM max %", "USS max (Mo)"],
+            [(n, f"{a:.1f}", f"{c:.1f}", f"{m:.1f}", f"{u / 1e6:.0f}" if u else "-") for n, a, c, m, u in watched]))
+
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html><html lang=\"fr\"><head><meta charset=\"utf-8\">"
+                "<title>Rapport du moniteur de processus</title><style>"
+                "body{font-family:sans-serif;margin:2em}img{max-width:100%}"
+                "table{border-collapse:collapse;margin-bottom:1em}"
+                "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}"
+                "td:first-child,th:first-child{text-align:left}"
+                "</style></head><body>" + "\n".join(sections) + "</body></html>")
+    print(f"Rapport écrit : {out_path} (+ {png_path})")
+    return out_path
+
+# --- Collecteur hors processus (mémoire partagée) ---
+RING_NAME = "process_monitor_ring"
+RING_MAGIC = b"PMR1"
+# En-tête : magic, nb d'emplacements, taille d'un emplacement, dernière séquence écrite,
+# battement de coeur, demande d'arrêt, demande de resynchronisation, PID du collecteur
+RING_HEADER = struct.Struct("<4sIIQdBBxxI")
+RING_SEQ_OFFSET = 12
+RING_BEAT_OFFSET = 20
+RING_STOP_OFFSET = 28
+RING_RESYNC_OFFSET = 29
+RING_SLOT_HEADER = struct.Struct("<QI") # séquence (écrite en dernier), longueur
+RING_SLOTS = 64
+RING_SLOT_SIZE = 256 * 1024
+RING_POLL_S = 0.05        # Lecture de l'anneau par la GUI
+RING_STALE_S = 10         # Sans battement depuis N s : collecteur considéré mort
+RING_JOIN_TIMEOUT_S = 5   # Attente d'un arrêt propre avant terminate()
+
+class SharedRing:
+    """
+    Anneau de messages JSON en mémoire partagée, un écrivain (le collecteur)
+    et un lecteur (la GUI). Chaque emplacement porte sa séquence, remise à 0
+    pendant l'écriture : le lecteur la relit après copie et détecte ainsi
+    un emplacement écrasé (lecteur trop lent) sans verrou entre processus.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.lock = threading.Lock() # Plusieurs threads écrivains dans le collecteur
+        magic, self.slot_count, self.slot_size, write_seq = RING_HEADER.unpack_from(shm.buf, 0)[:4]
+        if magic != RING_MAGIC:
+            raise ValueError(f"Segment '{shm.name}' inconnu")
+        self.read_seq = write_seq # Un lecteur ne reçoit que les nouveaux messages
+
+    @classmethod
+    def create(cls, name=RING_NAME, slot_count=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        """Crée l'anneau (côté collecteur). Lève FileExistsError s'il existe déjà."""
+        size = RING_HEADER.size + slot_count * (RING_SLOT_HEADER.size + slot_size)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, slot_count, slot_size, 0, time.time(), 0, 0, os.getpid())
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name=RING_NAME):
+        """Se rattache à un anneau existant (côté GUI). Lève FileNotFoundError s'il n'existe pas."""
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            return cls(shm)
+        except Exception:
+            shm.close()
+            raise
+
+    def untrack(self):
+        """
+        Avant Python 3.13, le resource_tracker détruit à la sortie tout segment
+        ouvert : à appeler quand on se rattache au collecteur d'un autre processus.
+        """
+        try:
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception as e:
+            print(f"Erreur resource_tracker : {e}")
+
+    def _slot_offset(self, seq):
+        return RING_HEADER.size + (seq % self.slot_count) * (RING_SLOT_HEADER.size + self.slot_size)
+
+    def publish(self, message):
+        """Écrit un message (dict sérialisable en JSON). Utilisé comme 'emit' du Collector."""
+        payload = json.dumps(message, separators=(",", ":")).encode()
+        if len(payload) > self.slot_size:
+            print(f"Message de {len(payload)} octets trop grand pour l'anneau, ignoré.")
+            return
+        buf = self.shm.buf
+        with self.lock:
+            seq = struct.unpack_from("<Q", buf, RING_SEQ_OFFSET)[0] + 1
+            offset = self._slot_offset(seq)
+            RING_SLOT_HEADER.pack_into(buf, offset, 0, 0) # Emplacement invalide pendant l'écriture
+            start = offset + RING_SLOT_HEADER.size
+            buf[start:start + len(payload)] = payload
+            RING_SLOT_HEADER.pack_into(buf, offset, seq, len(payload))
+            struct.pack_into("<Q", buf, RING_SEQ_OFFSET, seq)
+            struct.pack_into("<d", buf, RING_BEAT_OFFSET, time.time())
+
+    def read(self):
+        """
+        Renvoie les messages publiés depuis le dernier appel. Si des messages
+        ont été perdus (lecteur trop lent), une resynchronisation de l'index est demandée.
+        """
+        buf = self.shm.buf
+        write_seq = struct.unpack_from("<Q", buf, RING_SEQ_OFFSET)[0]
+        if write_seq < self.read_seq:
+            self.read_seq = 0 # Anneau recréé par un nouveau collecteur
+        if write_seq - self.read_seq > self.slot_count:
+            self.request_resync()
+            self.read_seq = write_seq - self.slot_count
+
+        messages = []
+        for seq in range(self.read_seq + 1, write_seq + 1):
+            offset = self._slot_offset(seq)
+            slot_seq, length = RING_SLOT_HEADER.unpack_from(buf, offset)
+            if slot_seq != seq:
+                self.request_resync()
+                continue
+            start = offset + RING_SLOT_HEADER.size
+            payload = bytes(buf[start:start + length])
+            if RING_SLOT_HEADER.unpack_from(buf, offset)[0] != seq: # Écrasé pendant la copie
+                self.request_resync()
+                continue
+            messages.append(json.loads(payload))
+        self.read_seq = write_seq
+        return messages
+
+    def beat(self):
+        struct.pack_into("<d", self.shm.buf, RING_BEAT_OFFSET, time.time())
+
+    def collector_pid(self):
+        return RING_HEADER.unpack_from(self.shm.buf, 0)[7]
+
+    def is_alive(self):
+        """Le collecteur bat-il encore (battement récent, arrêt non demandé, PID vivant) ?"""
+        _, _, _, _, heartbeat, stop, _, pid = RING_HEADER.unpack_from(self.shm.buf, 0)
+        return not stop and time.time() - heartbeat < RING_STALE_S and psutil.pid_exists(pid)
+
+    def request_stop(self):
+        self.shm.buf[RING_STOP_OFFSET] = 1
+
+    def stop_requested(self):
+        return self.shm.buf[RING_STOP_OFFSET] == 1
+
+    def request_resync(self):
+        self.shm.buf[RING_RESYNC_OFFSET] = 1
+
+    def take_resync(self):
+        """Côté collecteur : consomme une demande de resynchronisation de l'index."""
+        if self.shm.buf[RING_RESYNC_OFFSET]:
+            self.shm.buf[RING_RESYNC_OFFSET] = 0
+            return True
+        return False
+
+    def close(self, unlink=False):
+        try:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+        except Exception as e:
+            print(f"Erreur à la fermeture de l'anneau : {e}")
+
+def spawn_headless_collector(db_name, config_file, record_file=None):
+    """
+    Lance 'main.py collector' détaché de la GUI : comme un collecteur démarré
+    à la main, il continue de tourner quand l'interface est fermée.
+    """
+    if getattr(sys, "frozen", False):
+        command = [sys.executable] # Exécutable gelé : le programme lui-même
+    else:
+        command = [sys.executable, os.path.abspath(__file__)]
+    if record_file:
+        command += ["--record", record_file]
+    command += ["collector", "--db", db_name, "--config", config_file]
+    if os.name == "nt":
+        options = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {"start_new_session": True}
+    return subprocess.Popen(command, stdin=subprocess.DEVNULL, **options)
+
+def read_settings_file(config_file):
+    """Lit config.json en instantané Settings. Renvoie (settings, mtime)."""
+    try:
+        mtime = os.path.getmtime(config_file)
+        with open(config_file, 'r') as f:
+            return Settings.from_config(json.load(f)), mtime
+    except FileNotFoundError:
+        return Settings(), None
+    except Exception as e:
+        print(f"Erreur de lecture de {config_file} : {e}")
+        return Settings(), None
+
+def run_collector_process(db_name, config_file, ring_name=RING_NAME, record_file=None):
+    """
+    Point d'entrée du collecteur hors processus (lancé par la GUI, ou seul
+    via 'main.py collector'). Publie dans l'anneau partagé et relit config.json
+    quand il change. S'arrête sur demande de la GUI, SIGTERM ou Ctrl+C.
+    """
+    try:
+        ring = SharedRing.create(ring_name)
+    except FileExistsError:
+        # Même vérification que la GUI : un segment laissé par un collecteur tué est recréé
+        try:
+            stale = SharedRing.attach(ring_name)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Segment '{ring_name}' inutilisable : {e}")
+            return
+        if stale.is_alive():
+            stale.untrack() # Le segment appartient à l'autre processus
+            stale.close()
+            print(f"Un collecteur utilise déjà le segment '{ring_name}'.")
+            return
+        print("Segment d'un collecteur arrêté trouvé, suppression.")
+        stale.close(unlink=True)
+        ring = SharedRing.create(ring_name)
+
+    # Avant les threads : un éventuel VACUUM de conversion ne bloque aucune collecte
+    prepare_database(db_name)
+
+    settings, config_mtime = read_settings_file(config_file)
+    recorder = SampleRecorder(record_file) if record_file else None
+    collector = Collector(db_name, ring.publish, lambda: settings, recorder)
+    collector.export_index = True
+    collector.resync_requested = ring.take_resync
+    signal.signal(signal.SIGTERM, lambda signum, frame: collector.stop())
+
+    threads = [threading.Thread(target=collector.run, daemon=True),
+               threading.Thread(target=collector.run_maintenance, daemon=True)]
+    for thread in threads:
+        thread.start()
+    print(f"Collecteur démarré (PID {os.getpid()}, segment '{ring_name}').")
+
+    try:
+        while not collector.stop_event.is_set():
+            ring.beat()
+            if ring.stop_requested():
+                break
+            # Rechargement à chaud des réglages
+            try:
+                mtime = os.path.getmtime(config_file)
+            except OSError:
+                mtime = None
+            if mtime != config_mtime:
+                settings, config_mtime = read_settings_file(config_file)
+            collector.stop_event.wait(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        for thread in threads:
+            thread.join(RING_JOIN_TIMEOUT_S)
+        collector.close()
+        ring.close(unlink=True)
+        print("Collecteur arrêté.")
+
+# --- Icône de la barre système (mini-graphique) ---
+TRAY_ICON_SIZE = 64
+TRAY_BAR_WIDTH = 4            # Une barre CPU par tick : 16 ticks visibles
+TRAY_SPARK_HEIGHT = 48        # Barres CPU en haut...
+TRAY_GAUGE_HEIGHT = 12        # ...jauge RAM en bas
+TRAY_LEVELS = 24              # Hauteurs distinctes : un changement plus fin n'est pas redessiné
+TRAY_BACKGROUND = (32, 32, 32, 255)
+
+class TraySparkline:
+    """
+    Icône de la barre système : CPU des derniers ticks en barres et jauge RAM.
+    Chaque mise à jour ne fait que coller des tuiles pré-rendues (une par
+    niveau) dans deux images préallouées, en alternance : pystray peut encore
+    lire l'image précédente pendant qu'on dessine la suivante. Rien n'est
+    redessiné si l'image quantifiée est identique à la précédente.
+    """
+
+    def __init__(self, size=TRAY_ICON_SIZE):
+        self.size = size
+        self.bar_count = size // TRAY_BAR_WIDTH
+        self.buffers = [Image.new('RGBA', (size, size), TRAY_BACKGROUND) for _ in range(2)]
+        self.current = 0
+        self.state = None     # (niveaux CPU, niveau RAM) de la dernière image
+        self.threshold = None # Seuil CPU des tuiles en cache
+        self.bar_tiles = []
+        self.gauge_tiles = []
+
+    def _level_color(self, percent, threshold):
+        if percent >= threshold:
+            return (230, 60, 60, 255)
+        if percent >= threshold - 20:
+            return (240, 160, 40, 255)
+        return (80, 200, 80, 255)
+
+    def _build_tiles(self, threshold):
+        """Pré-rend une barre CPU et une jauge RAM par niveau (couleur selon le seuil CPU)."""
+        self.threshold = threshold
+        self.bar_tiles = []
+        self.gauge_tiles = []
+        for level in range(TRAY_LEVELS + 1):
+            bar = Image.new('RGBA', (TRAY_BAR_WIDTH, TRAY_SPARK_HEIGHT), TRAY_BACKGROUND)
+            height = round(level * TRAY_SPARK_HEIGHT / TRAY_LEVELS)
+            if height:
+                color = self._level_color(level * 100 / TRAY_LEVELS, threshold)
+                # Une colonne vide à droite sépare les barres
+                bar.paste(color, (0, TRAY_SPARK_HEIGHT - height, TRAY_BAR_WIDTH - 1, TRAY_SPARK_HEIGHT))
+            self.bar_tiles.append(bar)
+
+            gauge = Image.new('RGBA', (self.size, TRAY_GAUGE_HEIGHT), TRAY_BACKGROUND)
+            width = round(level * self.size / TRAY_LEVELS)
+            if width:
+                gauge.paste((240, 150, 40, 255), (0, 0, width, TRAY_GAUGE_HEIGHT)) # Orange comme la RAM du graphique
+            self.gauge_tiles.append(gauge)
+
+    def _quantize(self, percent):
+        return min(TRAY_LEVELS, max(0, round((percent or 0) * TRAY_LEVELS / 100)))
+
+    def render(self, cpu_history, ram, cpu_threshold):
+        """Renvoie la nouvelle image, ou None si rien de visible n'a changé."""
+        if cpu_threshold != self.threshold:
+            self._build_tiles(cpu_threshold)
+            self.state = None
+        levels = tuple(self._quantize(v) for v in list(cpu_history)[-self.bar_count:])
+        state = (levels, self._quantize(ram))
+        if state == self.state:
+            return None
+        self.state = state
+
+        self.current ^= 1
+        image = self.buffers[self.current]
+        offset = self.bar_count - len(levels) # Barres alignées à droite tant que l'historique est court
+        if offset:
+            image.paste(TRAY_BACKGROUND, (0, 0, offset * TRAY_BAR_WIDTH, TRAY_SPARK_HEIGHT))
+        for i, level in enumerate(levels):
+            image.paste(self.bar_tiles[level], ((offset + i) * TRAY_BAR_WIDTH, 0))
+        image.paste(self.gauge_tiles[state[1]], (0, self.size - TRAY_GAUGE_HEIGHT))
+        return image
+
+class ProcessMonitorApp(ThemedTk):
+    def __init__(self, record_file=None, replay_file=None, replay_speed=1.0, db_name='system_monitor.db',
+                 collector_mode=None):
         # --- Fichier de config et valeurs par défaut ---
         self.config_file = 'config.json'
         self.widget_alpha = 0.8
@@ -39,42 +2591,88 @@ class ProcessMonitorApp(ThemedTk):
         self.title("Process Monitor by xjapan ")
         self.geometry("800x600")
 
-        # --- Variables pour les seuils d'alerte ---
-        self.cpu_threshold_var = tk.IntVar(value=90)
-        self.ram_threshold_var = tk.IntVar(value=90)
-        self.gpu_threshold_var = tk.IntVar(value=90)
-        self.process_cpu_threshold_var = tk.IntVar(value=50) # Alerte si un seul processus dépasse
-
-        # --- Verrous d'alerte (pour éviter le spam) ---
-        self.system_alert_triggered = {
-            "cpu": False,
-            "ram": False,
-            "gpu": False
+        # --- Réglages (instantané immuable lu par le worker) ---
+        self.settings = Settings()
+        self.config_mtime = None      # Date du config.json chargé/écrit par nous
+        self.loading_settings = False # Évite de ré-écrire config.json pendant un chargement
+        self.save_after_id = None
+
+        # --- Variables pour les seuils d'alerte (liées aux Spinbox) ---
+        self.cpu_threshold_var = tk.IntVar(value=self.settings.cpu_threshold)
+        self.ram_threshold_var = tk.IntVar(value=self.settings.ram_threshold)
+        self.gpu_threshold_var = tk.IntVar(value=self.settings.gpu_threshold)
+        self.process_cpu_threshold_var = tk.IntVar(value=self.settings.process_cpu_threshold) # Alerte si un seul processus dépasse
+        self.group_cpu_threshold_var = tk.IntVar(value=self.settings.group_cpu_threshold) # Alerte si un groupe de processus dépasse
+        self.cgroup_cpu_threshold_var = tk.IntVar(value=self.settings.cgroup_cpu_threshold) # Alerte si un cgroup dépasse (% machine)
+        self.days_to_keep = tk.IntVar(value=self.settings.days_to_keep)
+        self.update_interval_var = tk.IntVar(value=self.settings.update_interval_ms)
+
+        # Champ de Settings -> variable Tkinter
+        self.settings_vars = {
+            "cpu_threshold": self.cpu_threshold_var,
+            "ram_threshold": self.ram_threshold_var,
+            "gpu_threshold": self.gpu_threshold_var,
+            "process_cpu_threshold": self.process_cpu_threshold_var,
+            "group_cpu_threshold": self.group_cpu_threshold_var,
+            "cgroup_cpu_threshold": self.cgroup_cpu_threshold_var,
+            "days_to_keep": self.days_to_keep,
+            "update_interval_ms": self.update_interval_var
         }
-        # Dictionnaire pour les processus déjà signalés {pid: "nom"}
-        self.process_alert_triggered = {}
+        for var in self.settings_vars.values():
+            var.trace_add("write", self.on_settings_var_change)
+
+        # --- Index des processus (recherche) et liste de surveillance ---
+        self.process_index = ProcessIndex()
+        self.active_filter = None # Termes du filtre affiché (None = top N)
+        self.filter_after_id = None
+
+        # --- Détails mémoire coûteux (cache du collecteur ; absent hors processus) ---
+        self.detail_collector = None
+
+        # --- Arbre des groupes ---
+        self.tree_open_keys = set() # Groupes dépliés dans le TreeView
 
         # --- Données pour le graphique ---
         self.cpu_history = deque(maxlen=GRAPH_HISTORY_SIZE)
         self.ram_history = deque(maxlen=GRAPH_HISTORY_SIZE)
         self.fan_history = deque(maxlen=GRAPH_HISTORY_SIZE) 
         self.gpu_history = deque(maxlen=GRAPH_HISTORY_SIZE) 
+        self.churn_history = deque(maxlen=GRAPH_HISTORY_SIZE) # Processus créés par seconde
+        # Bande attendue (moyenne, écart-type) de la ligne de base, None avant amorçage
+        self.band_history = {metric: deque(maxlen=GRAPH_HISTORY_SIZE) for metric in BASELINE_METRICS}
 
         # --- Configuration de la base de données ---
-        self.db_name = 'system_monitor.db'
-        self.db_conn = None  
+        self.db_name = db_name
 
         # --- File d'attente pour la communication ---
         self.data_queue = queue.Queue()
 
+        # --- Collecteur (thread de l'application OU processus séparé) ---
+        self.record_file = record_file # Enregistrement des ticks (optionnel)
+        self.collector = None          # Collector (mode thread)
+        self.collector_threads = []
+        self.collector_process = None  # Processus lancé par nous (mode processus)
+        self.ring = None               # Anneau partagé (mode processus)
+        self.ring_reader_stop = threading.Event()
+        self.ring_reader_thread = None
+        self.collector_mode_override = collector_mode
+
         # --- Configuration de l'interface ---
         self.setup_ui()
 
+        # --- Charger les préférences utilisateur (avant de démarrer les threads) ---
+        self.load_settings()
+        self.after(CONFIG_POLL_MS, self.watch_config_file)
+
         # --- Charger l'historique initial de la DB pour le graphique ---
         self.load_initial_graph_data()
 
-        # --- Démarrer le thread de travail (collecte + DB) ---
-        self.start_worker_thread() # <--- Sera modifié
+        if replay_file:
+            # --- Mode rejeu : pas de collecte live ni de maintenance ---
+            self.start_replay_thread(replay_file, replay_speed)
+        else:
+            # --- Démarrer la collecte + maintenance DB (thread ou processus séparé) ---
+            self.start_collector()
 
         # --- Lancer la boucle de rafraîchissement de l'interface ---
         self.process_gui_queue()
@@ -90,26 +2688,10 @@ class ProcessMonitorApp(ThemedTk):
         
         # --- Ajouts pour pystray ---
         self.tray_icon = None 
+        self.tray_sparkline = TraySparkline() # Icône redessinée depuis le thread GUI
         tray_thread = threading.Thread(target=self.setup_system_tray, daemon=True)
         tray_thread.start()
-        
-        # --- Initialisation GPU NVIDIA ---
-        self.gpu_handle = None
-        global NVIDIA_AVAILABLE 
-        if NVIDIA_AVAILABLE: 
-            try:
-                pynvml.nvmlInit()
-                self.gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(0) 
-                print("Surveillance NVIDIA initialisée.")
-            except Exception as e:
-                print(f"Erreur init pynvml (NVIDIA) : {e}. (Pilote à jour ?)")
-                NVIDIA_AVAILABLE = False 
-        else:
-            print("Bibliothèque pynvml non trouvée. Surveillance GPU NVIDIA désactivée.")
-            
-        # --- Charger les préférences utilisateur ---
-        self.load_settings()
-        
+
     def setup_ui(self):
         """Crée les éléments de l'interface utilisateur."""
         
@@ -128,9 +2710,23 @@ class ProcessMonitorApp(ThemedTk):
         self.theme_combo.bind("<<ComboboxSelected>>", self.on_theme_change)
 
         ttk.Label(config_frame_line1, text="Nettoyer l'historique après (jours):").pack(side=tk.LEFT, padx=20)
-        self.days_to_keep = tk.IntVar(value=7)
         ttk.Spinbox(config_frame_line1, from_=1, to_=365, textvariable=self.days_to_keep, width=5).pack(side=tk.LEFT)
 
+        ttk.Label(config_frame_line1, text="Intervalle (ms):").pack(side=tk.LEFT, padx=(20,5))
+        ttk.Spinbox(config_frame_line1, from_=250, to_=10000, increment=250,
+                    textvariable=self.update_interval_var, width=6).pack(side=tk.LEFT)
+        self.maintenance_label = ttk.Label(config_frame_line1, text="")
+        self.maintenance_label.pack(side=tk.RIGHT, padx=5)
+        ttk.Button(config_frame_line1, text="Redémarrer le collecteur",
+                   command=self.on_restart_collector).pack(side=tk.RIGHT, padx=5)
+
+        ttk.Label(config_frame_line1, text="Regroupement :").pack(side=tk.LEFT, padx=(20,5))
+        self.aggregation_combo = ttk.Combobox(config_frame_line1, state="readonly", width=12)
+        self.aggregation_combo['values'] = list(AGGREGATION_MODES.values())
+        self.aggregation_combo.set(AGGREGATION_MODES[self.settings.aggregation_mode])
+        self.aggregation_combo.pack(side=tk.LEFT)
+        self.aggregation_combo.bind("<<ComboboxSelected>>", self.on_aggregation_change)
+
         # --- Ligne 2: Seuils d'alerte ---
         config_frame_line2 = ttk.Frame(config_frame)
         config_frame_line2.pack(fill='x', pady=5)
@@ -147,6 +2743,14 @@ class ProcessMonitorApp(ThemedTk):
         ttk.Label(config_frame_line2, text="Alerte Processus (%):").pack(side=tk.LEFT, padx=(20,0))
         ttk.Spinbox(config_frame_line2, from_=1, to_=100, textvariable=self.process_cpu_threshold_var, width=4).pack(side=tk.LEFT)
         
+        # Un groupe peut dépasser 100 % (plusieurs coeurs)
+        ttk.Label(config_frame_line2, text="Groupe (%):").pack(side=tk.LEFT, padx=(10,0))
+        ttk.Spinbox(config_frame_line2, from_=1, to_=100 * (psutil.cpu_count() or 1),
+                    textvariable=self.group_cpu_threshold_var, width=5).pack(side=tk.LEFT)
+
+        ttk.Label(config_frame_line2, text="cgroup (%):").pack(side=tk.LEFT, padx=(10,0))
+        ttk.Spinbox(config_frame_line2, from_=1, to_=100, textvariable=self.cgroup_cpu_threshold_var, width=4).pack(side=tk.LEFT)
+        
         # --- Panneau principal (divisé) ---
         main_pane = ttk.PanedWindow(self, orient=tk.VERTICAL)
         main_pane.pack(fill=tk.BOTH, expand=True)
@@ -234,20 +2838,48 @@ class ProcessMonitorApp(ThemedTk):
         
         ttk.Label(parent_frame, text="Processus les plus consommateurs (CPU)", font=("Helvetica", 10, "bold")).pack(pady=5)
 
-        cols = ('pid', 'name', 'cpu', 'ram')
-        self.tree = ttk.Treeview(parent_frame, columns=cols, show='headings')
-
-        # Définir les en-têtes
+        # --- Barre de recherche / surveillance ---
+        filter_frame = ttk.Frame(parent_frame)
+        filter_frame.pack(fill='x', padx=5)
+        ttk.Label(filter_frame, text="Filtre :").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter_change)
+        filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var, width=40)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(filter_frame, text="Surveiller", command=self.add_watch_filter).pack(side=tk.LEFT)
+        ttk.Button(filter_frame, text="Vider la surveillance", command=self.clear_watch_filters).pack(side=tk.LEFT, padx=5)
+        self.filter_status = ttk.Label(filter_frame, text="(nom, re:regex, user:nom, pid:123, cmd:texte)")
+        self.filter_status.pack(side=tk.LEFT, padx=5)
+
+        cols = ('pid', 'name', 'count', 'cpu', 'ram', 'uss', 'threads', 'cgroup')
+        self.tree = ttk.Treeview(parent_frame, columns=cols, show='headings',
+                                 displaycolumns=('pid', 'name', 'cpu', 'ram'))
+
+        # Définir les en-têtes ('#0' = colonne arbre, utilisée en mode regroupé)
+        self.tree.heading('#0', text='Groupe')
         self.tree.heading('pid', text='PID')
         self.tree.heading('name', text='Nom')
+        self.tree.heading('count', text='Nb')
         self.tree.heading('cpu', text='CPU %')
         self.tree.heading('ram', text='RAM %')
+        self.tree.heading('uss', text='USS (Mo)')
+        self.tree.heading('threads', text='Threads')
+        self.tree.heading('cgroup', text='cgroup')
 
         # Ajuster les colonnes
+        self.tree.column('#0', width=250)
         self.tree.column('pid', width=60, anchor=tk.E)
         self.tree.column('name', width=250)
+        self.tree.column('count', width=50, anchor=tk.E)
         self.tree.column('cpu', width=80, anchor=tk.E)
         self.tree.column('ram', width=80, anchor=tk.E)
+        self.tree.column('uss', width=80, anchor=tk.E)
+        self.tree.column('threads', width=60, anchor=tk.E)
+        self.tree.column('cgroup', width=220)
+
+        # Mémoriser les groupes dépliés (pour les conserver au rafraîchissement)
+        self.tree.bind("<<TreeviewOpen>>", lambda e: self.tree_open_keys.add(self.tree.focus()))
+        self.tree.bind("<<TreeviewClose>>", lambda e: self.tree_open_keys.discard(self.tree.focus()))
 
         # Ajouter une barre de défilement
         scrollbar = ttk.Scrollbar(parent_frame, orient=tk.VERTICAL, command=self.tree.yview)
@@ -261,25 +2893,10 @@ class ProcessMonitorApp(ThemedTk):
         try:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
-            # Créer la table au cas où elle n'existerait pas
-            # AJOUT de fan_rpm INTEGER
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS system_stats (
-                    timestamp DATETIME PRIMARY KEY,
-                    cpu_percent REAL,
-                    ram_percent REAL,
-                    fan_rpm INTEGER
-                )
-            """)
-            
-            # Tenter de mettre à jour l'ancienne table si 'fan_rpm' manque
-            try:
-                cursor.execute("ALTER TABLE system_stats ADD COLUMN fan_rpm INTEGER DEFAULT 0")
-            except sqlite3.OperationalError:
-                pass # La colonne existe déjà, c'est normal
+            init_database(conn)
 
             # Récupérer les N dernières entrées
-            cursor.execute("SELECT cpu_percent, ram_percent, fan_rpm FROM system_stats ORDER BY timestamp DESC LIMIT ?", (GRAPH_HISTORY_SIZE,))
+            cursor.execute("SELECT cpu_percent, ram_percent, fan_rpm, proc_churn FROM system_stats ORDER BY timestamp DESC LIMIT ?", (GRAPH_HISTORY_SIZE,))
             rows = cursor.fetchall()
             conn.close()
 
@@ -289,226 +2906,254 @@ class ProcessMonitorApp(ThemedTk):
                     self.cpu_history.append(row[0])
                     self.ram_history.append(row[1])
                     self.fan_history.append(row[2] or 0) # 'or 0' au cas où c'est None
+                    self.churn_history.append(row[3] or 0)
+                    for history in self.band_history.values():
+                        history.append(None)
                 self.update_graph_display() # Afficher le graphique initial
         except Exception as e:
             print(f"Erreur lors du chargement de l'historique : {e}")
 
-    def start_worker_thread(self):
-        """Démarre le thread qui collecte les données ET gère la DB."""
-        worker = threading.Thread(
-            target=self.data_collection_worker,
-            args=( # Passer les variables Tkinter au thread
-                self.days_to_keep,
-                self.cpu_threshold_var,
-                self.ram_threshold_var,
-                self.gpu_threshold_var,
-                self.process_cpu_threshold_var
-            ), 
-            daemon=True
-        )
-        worker.start()
-
-    def data_collection_worker(self, days_to_keep_var, cpu_thresh_var, ram_thresh_var, 
-                               gpu_thresh_var, proc_thresh_var):
-        """
-        Le "worker" : collecte, gère la DB, ET vérifie les alertes.
-        S'exécute dans un thread séparé.
-        """
+    def start_collector(self):
+        """Démarre la collecte selon le mode choisi (CLI, sinon config.json)."""
+        mode = self.collector_mode_override or self.settings.collector_mode
+        if mode == "process":
+            self.start_collector_process()
+            return
+
+        # Avant les threads : un éventuel VACUUM de conversion ne bloque aucune collecte
+        prepare_database(self.db_name)
+        recorder = SampleRecorder(self.record_file) if self.record_file else None
+        self.collector = Collector(self.db_name, self.data_queue.put, lambda: self.settings, recorder)
+        self.process_index = self.collector.process_index
+        self.detail_collector = self.collector.detail_collector
+        # Thread de travail (collecte + DB) et thread de maintenance DB (rétention + vacuum)
+        self.collector_threads = [threading.Thread(target=self.collector.run, daemon=True),
+                                  threading.Thread(target=self.collector.run_maintenance, daemon=True)]
+        for thread in self.collector_threads:
+            thread.start()
+
+    def start_collector_process(self):
+        """Se rattache à un collecteur déjà lancé, sinon en démarre un (processus 'spawn')."""
+        ring = None
         try:
-            self.db_conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            cursor = self.db_conn.cursor()
-            # (Le code de création de table/DB est dans load_initial_graph_data)
+            ring = SharedRing.attach(RING_NAME)
+            if ring.is_alive():
+                ring.untrack() # Le segment appartient à l'autre processus
+                print(f"Rattaché au collecteur existant (PID {ring.collector_pid()}).")
+            else:
+                print("Segment d'un collecteur arrêté trouvé, suppression.")
+                ring.close(unlink=True)
+                ring = None
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            print(f"Erreur de connexion DB dans le worker : {e}")
-            return 
-
-        last_cleanup_time = 0
-        current_pids = set() # Pour suivre les processus en vie
-
-        while True:
-            try:
-                # --- 1. Collecte des données Système ---
-                cpu = psutil.cpu_percent(interval=None) 
-                ram = psutil.virtual_memory().percent
-                timestamp = datetime.datetime.now()
-
-                # --- 2. Collecte des données GPU (si possible) ---
-                gpu_text = "N/A"
-                gpu_util = 0 
-                if self.gpu_handle: 
-                    try:
-                        util_rates = pynvml.nvmlDeviceGetUtilizationRates(self.gpu_handle)
-                        gpu_util = util_rates.gpu 
-                        gpu_text = f"{gpu_util} %"
-                    except Exception as e:
-                        gpu_text = "Err"
-                        
-                # --- 3. Collecte des données Ventilateur (si possible) ---
-                fan_text = "N/A"
-                fan_rpm = 0 
+            print(f"Erreur de rattachement au collecteur : {e}")
+            ring = None
+
+        if ring is None:
+            ctx = multiprocessing.get_context("spawn")
+            self.collector_process = ctx.Process(target=run_collector_process,
+                                                 args=(self.db_name, self.config_file, RING_NAME, self.record_file))
+            self.collector_process.start()
+            # Attendre la création de l'anneau par le nouveau processus
+            deadline = time.time() + RING_STALE_S
+            while ring is None and time.time() < deadline and self.collector_process.is_alive():
                 try:
-                    fans = psutil.sensors_fans()
-                    if fans:
-                        first_fan_key = list(fans.keys())[0]
-                        fan_rpm = fans[first_fan_key][0].current
-                        fan_text = f"{fan_rpm} RPM"
-                except Exception as e:
-                    pass 
-
-                # --- 4. Vérification des Alertes Système ---
-                # Lire les seuils depuis les variables Tkinter
-                cpu_alert_level = cpu_thresh_var.get()
-                ram_alert_level = ram_thresh_var.get()
-                gpu_alert_level = gpu_thresh_var.get()
-                
-                # Définir des seuils de "retour à la normale" (pour réinitialiser l'alerte)
-                cpu_reset_level = cpu_alert_level - 10
-                ram_reset_level = ram_alert_level - 10
-                gpu_reset_level = gpu_alert_level - 10
-                
-                # Logique de "verrou" (latching)
-                if cpu > cpu_alert_level and not self.system_alert_triggered["cpu"]:
-                    self.system_alert_triggered["cpu"] = True
-                    self.data_queue.put({"alert": "system", "type": "CPU", "value": cpu})
-                elif cpu < cpu_reset_level and self.system_alert_triggered["cpu"]:
-                    self.system_alert_triggered["cpu"] = False # Réinitialiser le verrou
-
-                if ram > ram_alert_level and not self.system_alert_triggered["ram"]:
-                    self.system_alert_triggered["ram"] = True
-                    self.data_queue.put({"alert": "system", "type": "RAM", "value": ram})
-                elif ram < ram_reset_level and self.system_alert_triggered["ram"]:
-                    self.system_alert_triggered["ram"] = False
-
-                if gpu_util > gpu_alert_level and not self.system_alert_triggered["gpu"]:
-                    self.system_alert_triggered["gpu"] = True
-                    self.data_queue.put({"alert": "system", "type": "GPU", "value": gpu_util})
-                elif gpu_util < gpu_reset_level and self.system_alert_triggered["gpu"]:
-                    self.system_alert_triggered["gpu"] = False
-                    
-                # --- 5. Collecte des Processus ET Vérification Alertes Processus ---
-                processes = []
-                current_pids.clear()
-                proc_alert_level = proc_thresh_var.get()
-                
-                for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                    try:
-                        pinfo = proc.info
-                        current_pids.add(pinfo['pid']) # Garder une trace des PID en vie
-
-                        # 'cpu_percent' peut être None au premier appel
-                        if pinfo['cpu_percent'] is not None:
-                            processes.append(pinfo)
-                            
-                            # NOUVEAU : Vérification Alerte Processus
-                            if pinfo['cpu_percent'] > proc_alert_level:
-                                pid = pinfo['pid']
-                                # Si le PID n'est pas déjà dans notre liste d'alerte...
-                                if pid not in self.process_alert_triggered:
-                                    self.process_alert_triggered[pid] = pinfo['name'] # ...on l'ajoute...
-                                    # ...et on envoie une alerte
-                                    self.data_queue.put({
-                                        "alert": "process", 
-                                        "name": pinfo['name'], 
-                                        "pid": pid, 
-                                        "value": pinfo['cpu_percent']
-                                    })
-                                    
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        pass # Le processus est mort pendant l'itération
-                
-                # Nettoyer la liste des alertes (retirer les processus morts)
-                triggered_pids = list(self.process_alert_triggered.keys())
-                for pid in triggered_pids:
-                    if pid not in current_pids:
-                        del self.process_alert_triggered[pid]
-
-                # Trier et prendre le TOP N pour affichage
-                top_processes = sorted(processes, key=lambda p: p['cpu_percent'], reverse=True)[:TOP_PROCESS_COUNT]
-
-                # --- 6. Mettre les données STATS dans la file ---
-                self.data_queue.put({
-                    "cpu": cpu, "ram": ram, "processes": top_processes,
-                    "fan_text": fan_text, "fan_rpm": fan_rpm,
-                    "gpu_text": gpu_text, "gpu_util": gpu_util
-                })
+                    ring = SharedRing.attach(RING_NAME)
+                except (FileNotFoundError, ValueError):
+                    time.sleep(RING_POLL_S)
+            if ring is None:
+                print("Le collecteur n'a pas démarré.")
+                return
+
+        # La GUI garde une copie de l'index et des détails (reconstruite par resynchronisation)
+        self.process_index = ProcessIndex()
+        self.detail_collector = ProcessDetailCollector()
+        ring.request_resync()
+        self.ring = ring
+        self.ring_reader_stop.clear()
+        self.ring_reader_thread = threading.Thread(target=self.ring_reader_worker, args=(ring,), daemon=True)
+        self.ring_reader_thread.start()
+
+    def ring_reader_worker(self, ring):
+        """Relaie les messages de l'anneau vers la file GUI (l'index est appliqué ici, hors GUI)."""
+        warned = False
+        while not self.ring_reader_stop.is_set():
+            try:
+                for message in ring.read():
+                    if "index_added" in message:
+                        self.process_index.apply_changes(message)
+                        self.detail_collector.apply_changes(message)
+                    else:
+                        self.data_queue.put(message)
+                alive = ring.is_alive()
+                if not alive and not warned:
+                    print("Le collecteur ne répond plus (utilisez 'Redémarrer le collecteur').")
+                warned = not alive
+            except Exception as e:
+                print(f"Erreur de lecture de l'anneau : {e}")
+            self.ring_reader_stop.wait(RING_POLL_S)
 
-                # --- 7. Insérer dans la DB ---
+    def stop_collector(self):
+        """
+        Arrête le collecteur que nous avons lancé (thread ou processus).
+        Un collecteur externe auquel on s'est rattaché continue de tourner.
+        """
+        if self.collector:
+            self.collector.stop()
+            for thread in self.collector_threads:
+                thread.join(RING_JOIN_TIMEOUT_S)
+            self.collector.close()
+            self.collector = None
+            self.collector_threads = []
+
+        if self.ring:
+            self.ring_reader_stop.set()
+            if self.ring_reader_thread:
+                self.ring_reader_thread.join(RING_JOIN_TIMEOUT_S)
+            if self.collector_process:
+                self.ring.request_stop()
+            self.ring.close()
+            self.ring = None
+
+        if self.collector_process:
+            self.collector_process.join(RING_JOIN_TIMEOUT_S)
+            if self.collector_process.is_alive():
+                print("Le collecteur ne s'arrête pas, terminate().")
+                self.collector_process.terminate()
+                self.collector_process.join(RING_JOIN_TIMEOUT_S)
+            self.collector_process = None
+
+    def restart_collector(self):
+        """
+        Arrête puis relance le collecteur. Un collecteur externe rattaché est
+        relancé sans interface (détaché), pour qu'il survive toujours à la GUI.
+        """
+        external = self.ring is not None and not self.collector_process
+        if external:
+            # Collecteur externe : lui demander de s'arrêter et attendre sa sortie
+            pid = self.ring.collector_pid()
+            self.ring.request_stop()
+            deadline = time.time() + RING_JOIN_TIMEOUT_S
+            while psutil.pid_exists(pid) and time.time() < deadline:
+                time.sleep(RING_POLL_S)
+        self.stop_collector()
+        if external:
+            try:
+                process = spawn_headless_collector(self.db_name, self.config_file, self.record_file)
+            except OSError as e:
+                print(f"Impossible de relancer le collecteur externe : {e}")
+                return
+            # Attendre son anneau : start_collector() s'y rattachera au lieu de lancer un enfant
+            deadline = time.time() + RING_STALE_S
+            while time.time() < deadline and process.poll() is None:
                 try:
-                    cursor.execute("INSERT INTO system_stats (timestamp, cpu_percent, ram_percent, fan_rpm, gpu_percent) VALUES (?, ?, ?, ?, ?)",
-                                   (timestamp, cpu, ram, fan_rpm, gpu_util))
-                    self.db_conn.commit()
-                except Exception as e:
-                    print(f"Erreur d'insertion DB : {e}")
-
-                # --- 8. Gérer le nettoyage DB ---
-                current_time = time.time()
-                if current_time - last_cleanup_time > 3600: # 1 fois par heure
-                    try:
-                        days = days_to_keep_var.get()
-                        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
-                        cursor.execute("DELETE FROM system_stats WHERE timestamp < ?", (cutoff_date,))
-                        self.db_conn.commit()
-                        print(f"Nettoyage DB effectué : suppression des entrées avant {cutoff_date}")
-                    except Exception as e:
-                        print(f"Erreur lors du nettoyage DB : {e}")
-                    finally:
-                        last_cleanup_time = current_time
-
-                # Attendre avant la prochaine boucle
-                time.sleep(UPDATE_INTERVAL_MS / 1000.0)
-
-            except Exception as e:
-                print(f"Erreur dans le worker : {e}")
-                time.sleep(UPDATE_INTERVAL_MS / 1000.0)
+                    probe = SharedRing.attach(RING_NAME)
+                except (FileNotFoundError, ValueError):
+                    time.sleep(RING_POLL_S)
+                    continue
+                probe.untrack() # Le segment appartient au collecteur
+                started = probe.collector_pid() == process.pid # Pas un ancien segment
+                probe.close()
+                if started:
+                    break
+                time.sleep(RING_POLL_S)
+        self.start_collector()
+        print("Collecteur redémarré.")
+
+    def on_restart_collector(self):
+        """Bouton 'Redémarrer le collecteur' (les attentes se font hors du thread GUI)."""
+        threading.Thread(target=self.restart_collector, daemon=True).start()
+
+    def start_replay_thread(self, replay_file, speed):
+        """Rejoue un enregistrement via un collecteur dédié (sans scan ni maintenance)."""
+        self.collector = Collector(self.db_name, self.data_queue.put, lambda: self.settings)
+        self.collector_threads = [threading.Thread(target=self.collector.replay, args=(replay_file, speed), daemon=True)]
+        self.collector_threads[0].start()
 
     def process_gui_queue(self):
         """
-        Vérifie la file d'attente pour les données OU les alertes.
+        Vide la file d'attente (données OU alertes).
+        Toutes les stats sont ajoutées à l'historique, mais l'affichage
+        n'est redessiné qu'une fois, avec la plus récente.
         S'exécute dans le thread principal (GUI).
         """
+        latest = None
         try:
-            # Récupérer un item (stats OU alerte)
-            data = self.data_queue.get(block=False)
-            
-            if data:
+            while True:
+                # Récupérer un item (stats OU alerte)
+                data = self.data_queue.get(block=False)
+                
+                if not data:
+                    continue
                 if "alert" in data:
                     self.show_alert(data) # Appeler la fonction de popup
+
+                elif "maintenance" in data:
+                    report = data["maintenance"]
+                    self.maintenance_label.config(
+                        text=f"Dernier nettoyage : {report['deleted']} lignes, "
+                             f"{report['reclaimed'] / 1e6:.1f} Mo libérés"
+                    )
+
+                elif "replay_done" in data:
+                    # Tous les échantillons précédents ont été traités par la GUI
+                    done = data["replay_done"]
+                    elapsed = time.perf_counter() - done["started"]
+                    print(f"Rejeu terminé (pipeline complet jusqu'à la GUI) : {done['count']} échantillons "
+                          f"en {elapsed:.2f} s ({done['count'] / elapsed if elapsed else 0:.0f} éch./s)")
                                 
                 else:
-                    # C'est un message de stats normal, mettre à jour la GUI
+                    # C'est un message de stats normal, mémoriser l'historique
                     self.cpu_history.append(data['cpu'])
                     self.ram_history.append(data['ram'])
                     self.fan_history.append(data.get('fan_rpm', 0)) 
                     self.gpu_history.append(data.get('gpu_util', 0)) 
-                    
-                    if self.winfo_viewable(): 
-                        self.update_graph_display()
-                    
-                    self.update_process_list_display(data['processes'])
-                    
-                    # Mettre à jour le widget
-                    if self.widget_window and self.widget_window.winfo_exists():
-                        fan_text = data.get("fan_text", "N/A") 
-                        gpu_text = data.get("gpu_text", "N/A") 
-                        
-                        widget_text = (
-                            f"CPU: {data['cpu']:.1f} %\n"
-                            f"RAM: {data['ram']:.1f} %\n"
-                            f"GPU: {gpu_text}\n"        
-                            f"Fan: {fan_text}"
-                        )
-                        
-                        if self.widget_shape == "circle" and self.widget_canvas and self.widget_text_id:
-                            self.widget_canvas.itemconfig(self.widget_text_id, text=widget_text)
-                        elif self.widget_shape == "square" and self.widget_label:
-                            self.widget_label.config(text=widget_text)
+                    self.churn_history.append(data.get('churn', 0))
+                    bands = data.get('baseline') or {}
+                    for metric, history in self.band_history.items():
+                        history.append(bands.get(metric))
+                    latest = data
 
         except queue.Empty:
-            # C'est normal s'il n'y a pas de données
+            # C'est normal s'il n'y a plus de données
             pass
+
+        if latest:
+            self.refresh_display(latest)
         
         # Redemander à Tkinter d'appeler cette fonction
         self.after(250, self.process_gui_queue)
+
+    def refresh_display(self, data):
+        """Met à jour le graphique, la liste des processus et le widget."""
+        if self.winfo_viewable(): 
+            self.update_graph_display()
+        
+        if self.active_filter:
+            self.update_process_list_display(self.search_processes(self.active_filter))
+        else:
+            self.update_process_list_display(data['processes'], data.get('mode', "pid"), data.get('groups', []))
+        
+        # Mettre à jour le widget
+        if self.widget_window and self.widget_window.winfo_exists():
+            fan_text = data.get("fan_text", "N/A") 
+            gpu_text = data.get("gpu_text", "N/A") 
+            
+            widget_text = (
+                f"CPU: {data['cpu']:.1f} %\n"
+                f"RAM: {data['ram']:.1f} %\n"
+                f"GPU: {gpu_text}\n"        
+                f"Fan: {fan_text}"
+            )
+            
+            if self.widget_shape == "circle" and self.widget_canvas and self.widget_text_id:
+                self.widget_canvas.itemconfig(self.widget_text_id, text=widget_text)
+            elif self.widget_shape == "square" and self.widget_label:
+                self.widget_label.config(text=widget_text)
+
+        # Icône de la barre système (ici, dans le thread GUI : jamais dans le collecteur)
+        self.update_tray_icon(data)
         
     def show_alert(self, alert_data):
         """
@@ -535,6 +3180,34 @@ class ProcessMonitorApp(ThemedTk):
                     f"Utilisation: {alert_data['value']:.1f} %"
                 )
                 messagebox.showwarning(title, msg, parent=self)
+
+            elif alert_data["alert"] == "group":
+                title = "Alerte de Groupe de Processus"
+                msg = (
+                    f"Le groupe suivant consomme trop de CPU :\n\n"
+                    f"Groupe: {alert_data['name']} ({alert_data['count']} processus)\n"
+                    f"Utilisation cumulée: {alert_data['value']:.1f} %"
+                )
+                messagebox.showwarning(title, msg, parent=self)
+
+            elif alert_data["alert"] == "cgroup":
+                title = "Alerte de cgroup"
+                limit_text = " (de memory.max)" if alert_data['type'] == "RAM" else ""
+                msg = (
+                    f"Niveau critique atteint pour le {alert_data['type']} du cgroup :\n\n"
+                    f"{alert_data['name']}\n"
+                    f"Utilisation actuelle : {alert_data['value']:.1f} %{limit_text}"
+                )
+                messagebox.showwarning(title, msg, parent=self)
+
+            elif alert_data["alert"] == "anomaly":
+                title = "Anomalie détectée"
+                msg = (
+                    f"{alert_data['type']} inhabituel pour cette machine :\n\n"
+                    f"Utilisation actuelle : {alert_data['value']:.1f} %\n"
+                    f"Habituellement : {alert_data['mean']:.1f} % (écart : {alert_data['z']:.1f} σ)"
+                )
+                messagebox.showwarning(title, msg, parent=self)
         except Exception as e:
             print(f"Erreur lors de l'affichage de l'alerte : {e}")
 
@@ -549,15 +3222,38 @@ class ProcessMonitorApp(ThemedTk):
              self.ax_fan.clear()
         else:
             self.ax_fan = self.ax.twinx() 
+
+        # Troisième axe (décalé à droite) pour les processus créés par seconde
+        if hasattr(self, 'ax_churn'):
+            self.ax_churn.clear()
+        else:
+            self.ax_churn = self.ax.twinx()
+            self.fig.subplots_adjust(right=0.82)
+        self.ax_churn.spines['right'].set_position(('axes', 1.12))
         
         # Dessiner CPU/RAM/GPU sur l'axe principal
         self.ax.plot(list(self.cpu_history), label="CPU %", color='blue', linewidth=1.5)
         self.ax.plot(list(self.ram_history), label="RAM %", color='orange', linewidth=1.5)
         self.ax.plot(list(self.gpu_history), label="GPU %", color='purple', linewidth=1.5) 
+
+        # Bande attendue (ligne de base ± seuil d'anomalie), trouée tant qu'elle n'est pas prête
+        k = self.settings.anomaly_z
+        for metric, color in (("cpu", 'blue'), ("ram", 'orange'), ("gpu", 'purple')):
+            bands = list(self.band_history[metric])
+            if not any(bands):
+                continue
+            mean = np.array([b[0] if b else np.nan for b in bands])
+            std = np.array([b[1] if b else np.nan for b in bands])
+            self.ax.fill_between(range(len(bands)), mean - k * std, mean + k * std,
+                                 color=color, alpha=0.12, linewidth=0)
         
         # Dessiner Ventilateur sur l'axe secondaire
         fan_history_list = list(self.fan_history)
         self.ax_fan.plot(fan_history_list, label="Fan (RPM)", color='green', linewidth=1.5, linestyle=':')
+
+        # Dessiner les créations de processus sur le troisième axe
+        churn_history_list = list(self.churn_history)
+        self.ax_churn.plot(churn_history_list, label="Processus/s", color='red', linewidth=1, linestyle='--')
         
         # --- Stylisation des deux axes ---
         
@@ -579,32 +3275,132 @@ class ProcessMonitorApp(ThemedTk):
             display_max_rpm = max_rpm * 1.5 # Sinon, marge de 50%
             
         self.ax_fan.set_ylim(0, display_max_rpm) 
+
+        # Axe des processus/s (au moins 0-10 pour ne pas amplifier le bruit)
+        self.ax_churn.set_ylabel("proc/s", color='red')
+        self.ax_churn.set_ylim(0, max(max(churn_history_list or [0]) * 1.5, 10))
                 
         # Légendes combinées
         lines, labels = self.ax.get_legend_handles_labels()
         lines2, labels2 = self.ax_fan.get_legend_handles_labels()
-        self.ax_fan.legend(lines + lines2, labels + labels2, loc='upper left', fontsize='small')
+        lines3, labels3 = self.ax_churn.get_legend_handles_labels()
+        self.ax_churn.legend(lines + lines2 + lines3, labels + labels2 + labels3, loc='upper left', fontsize='small')
         
         self.ax.grid(True, linestyle=':', alpha=0.6)
         
         # Appliquer les changements au canevas
         self.canvas.draw()
 
-    def update_process_list_display(self, processes):
-        """Rafraîchit le TreeView avec la nouvelle liste de processus."""
+    def update_process_list_display(self, processes, mode="pid", groups=None):
+        """Rafraîchit le TreeView avec la nouvelle liste de processus (ou de groupes)."""
         
         # Effacer l'ancienne liste
         self.tree.delete(*self.tree.get_children())
         
+        if mode != "pid":
+            # --- Affichage en arbre dépliable ---
+            self.tree.configure(show='tree headings', displaycolumns=('pid', 'count', 'cpu', 'ram'))
+            for group in groups or []:
+                self.insert_group_node('', group)
+            return
+
+        # Afficher la colonne cgroup seulement si l'information est disponible
+        if processes and 'cgroup' in processes[0]:
+            self.tree.configure(show='headings', displaycolumns=('pid', 'name', 'cpu', 'ram', 'uss', 'threads', 'cgroup'))
+        else:
+            self.tree.configure(show='headings', displaycolumns=('pid', 'name', 'cpu', 'ram', 'uss', 'threads'))
+
         # Insérer les nouvelles données
         for proc in processes:
             pid = proc.get('pid', 'N/A')
             name = proc.get('name', 'N/A')
             cpu = proc.get('cpu_percent', 0.0)
             mem = proc.get('memory_percent', 0.0)
+            cgroup = proc.get('cgroup', '')
+
+            # Détails mémoire (peuvent manquer, ou dater de quelques ticks)
+            uss = ''
+            if proc.get('uss') is not None:
+                stale = '*' if proc.get('detail_age', 0) > DETAIL_STALE_S else ''
+                uss = f"{proc['uss'] / 1048576:.1f}{stale}"
+            threads = proc.get('num_threads', '')
             
             # Insérer la ligne dans le TreeView
-            self.tree.insert('', 'end', values=(pid, name, f"{cpu:.1f}", f"{mem:.1f}"))
+            self.tree.insert('', 'end', values=(pid, name, 1, f"{cpu:.1f}", f"{mem:.1f}", uss, threads, cgroup))
+
+    def insert_group_node(self, parent, node):
+        """Insère un groupe (et ses enfants) dans le TreeView, en conservant l'état déplié."""
+        key = node['key']
+        if self.tree.exists(key):
+            return # Un PID ne peut apparaître qu'une fois
+        self.tree.insert(parent, 'end', iid=key, text=node['label'],
+                         open=key in self.tree_open_keys,
+                         values=(node.get('pid', ''), node['label'], node['count'],
+                                 f"{node['cpu_percent']:.1f}", f"{node['memory_percent']:.1f}"))
+        for child in node['children']:
+            self.insert_group_node(key, child)
+
+    def on_filter_change(self, *args):
+        """Appelée à chaque frappe : le filtrage est différé (anti-rebond)."""
+        if self.filter_after_id:
+            self.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.after(FILTER_DEBOUNCE_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """Interroge l'index avec le filtre saisi et rafraîchit la liste."""
+        self.filter_after_id = None
+        text = self.filter_var.get().strip()
+        if not text:
+            self.active_filter = None
+            self.filter_status.config(text="(nom, re:regex, user:nom, pid:123, cmd:texte)")
+            return # La liste top N reviendra au prochain tick
+
+        try:
+            self.active_filter = parse_process_filter(text)
+        except (re.error, ValueError) as e:
+            self.filter_status.config(text=f"Filtre invalide : {e}")
+            return
+
+        results = self.search_processes(self.active_filter)
+        self.update_process_list_display(results)
+        self.filter_status.config(text=f"{len(results)} résultat(s)")
+
+    def search_processes(self, terms):
+        """Recherche dans l'index, complétée par les détails mémoire en cache."""
+        results = self.process_index.search(terms)
+        if self.detail_collector:
+            for entry in results:
+                entry.update(self.detail_collector.details((entry['pid'], entry['create_time'])) or {})
+        return results
+
+    def add_watch_filter(self):
+        """Ajoute le filtre courant à la liste de surveillance (persistée)."""
+        text = self.filter_var.get().strip()
+        if not text or text in self.settings.watch_filters:
+            return
+        try:
+            parse_process_filter(text)
+        except (re.error, ValueError) as e:
+            self.filter_status.config(text=f"Filtre invalide : {e}")
+            return
+        self.update_settings(watch_filters=self.settings.watch_filters + (text,))
+        self.filter_status.config(text=f"Surveillés : {len(self.settings.watch_filters)} filtre(s)")
+        self.save_settings()
+
+    def clear_watch_filters(self):
+        """Vide la liste de surveillance."""
+        self.update_settings(watch_filters=())
+        self.filter_status.config(text="Surveillance vidée")
+        self.save_settings()
+
+    def on_aggregation_change(self, event):
+        """Change le mode de regroupement (appliqué au prochain passage du worker)."""
+        label = self.aggregation_combo.get()
+        for mode, mode_label in AGGREGATION_MODES.items():
+            if mode_label == label:
+                self.update_settings(aggregation_mode=mode)
+        self.tree_open_keys.clear()
+        self.save_settings()
             
     def on_close_request(self):
         """
@@ -632,18 +3428,13 @@ class ProcessMonitorApp(ThemedTk):
             pass # Ne rien faire
 
     def quit_application(self):
-        """Ferme proprement l'application (Tkinter, Pystray et Pynvml)."""
+        """Ferme proprement l'application (Tkinter, Pystray, collecteur et Pynvml)."""
         
         # --- Sauvegarder l'état final ---
         self.save_settings()
-        
-        # Arrêter Pynvml
-        if NVIDIA_AVAILABLE and self.gpu_handle:
-            try:
-                pynvml.nvmlShutdown()
-                print("Surveillance NVIDIA arrêtée.")
-            except Exception as e:
-                print(f"Erreur lors de nvmlShutdown: {e}")
+
+        # Arrêter le collecteur (ou s'en détacher s'il ne nous appartient pas)
+        self.stop_collector()
         
         # Arrêter Pystray
         if self.tray_icon:
@@ -856,10 +3647,12 @@ class ProcessMonitorApp(ThemedTk):
         self.after(50, self.minimize_to_widget)
         
     def load_settings(self):
-        """Charge les préférences depuis config.json au démarrage."""
+        """Charge les préférences depuis config.json (au démarrage ET en cas de modification externe)."""
         try:
+            mtime = os.path.getmtime(self.config_file)
             with open(self.config_file, 'r') as f:
                 settings = json.load(f)
+            self.config_mtime = mtime
             
             # 1. Charger et appliquer le thème
             default_theme = "arc" # Thème par défaut si celui sauvé n'existe plus
@@ -867,7 +3660,8 @@ class ProcessMonitorApp(ThemedTk):
             if loaded_theme not in self.get_themes():
                 loaded_theme = default_theme
                 
-            self.set_theme(loaded_theme) 
+            if loaded_theme != self.current_theme:
+                self.set_theme(loaded_theme) 
             self.theme_combo.set(loaded_theme) # Mettre à jour le combobox
             
             # 2. Charger la forme du widget
@@ -875,6 +3669,19 @@ class ProcessMonitorApp(ThemedTk):
             
             # 3. Charger la transparence
             self.widget_alpha = float(settings.get("alpha", 0.8))
+
+            # 4. Seuils, intervalle, rétention, regroupement, cgroup, archive,
+            #    surveillance, budget des détails : un seul instantané publié d'un coup
+            self.settings = Settings.from_config(settings)
+
+            # 5. Synchroniser l'interface (sans déclencher de sauvegarde)
+            self.loading_settings = True
+            try:
+                for name, var in self.settings_vars.items():
+                    var.set(getattr(self.settings, name))
+                self.aggregation_combo.set(AGGREGATION_MODES[self.settings.aggregation_mode])
+            finally:
+                self.loading_settings = False
             
             print(f"Préférences chargées : {settings}")
 
@@ -886,19 +3693,57 @@ class ProcessMonitorApp(ThemedTk):
 
     def save_settings(self):
         """Sauvegarde les préférences actuelles dans config.json."""
+        if self.save_after_id:
+            self.after_cancel(self.save_after_id)
+            self.save_after_id = None
+
         settings = {
             "theme": self.current_theme,
             "shape": self.widget_shape,
             "alpha": self.widget_alpha
         }
+        settings.update(self.settings.to_config())
         
         try:
-            with open(self.config_file, 'w') as f:
+            # Écriture atomique : un rechargement ne lit jamais un fichier à moitié écrit
+            tmp_file = self.config_file + ".tmp"
+            with open(tmp_file, 'w') as f:
                 json.dump(settings, f, indent=4)
+            os.replace(tmp_file, self.config_file)
+            self.config_mtime = os.path.getmtime(self.config_file)
             print(f"Préférences sauvegardées : {settings}")
         except Exception as e:
             print(f"Erreur lors de la sauvegarde de config.json : {e}")
 
+    def update_settings(self, **changes):
+        """Publie un nouvel instantané des réglages (remplacement atomique)."""
+        self.settings = replace(self.settings, **changes)
+
+    def on_settings_var_change(self, *args):
+        """Une Spinbox a changé : publier l'instantané et sauvegarder (différé)."""
+        if self.loading_settings:
+            return
+        try:
+            values = {name: var.get() for name, var in self.settings_vars.items()}
+        except tk.TclError:
+            return # Saisie en cours (champ vide ou non numérique)
+        self.update_settings(**values)
+
+        if self.save_after_id:
+            self.after_cancel(self.save_after_id)
+        self.save_after_id = self.after(SETTINGS_SAVE_DELAY_MS, self.save_settings)
+
+    def watch_config_file(self):
+        """Recharge config.json s'il a été modifié par un autre programme."""
+        try:
+            mtime = os.path.getmtime(self.config_file)
+            if mtime != self.config_mtime:
+                print("config.json modifié, rechargement des préférences.")
+                self.load_settings()
+        except FileNotFoundError:
+            pass
+        self.after(CONFIG_POLL_MS, self.watch_config_file)
+
     def on_alpha_change(self, value_str):
         """Appelée par le slider de transparence."""
         self.widget_alpha = float(value_str)
@@ -912,6 +3757,9 @@ class ProcessMonitorApp(ThemedTk):
         
     def setup_system_tray(self):
         """Crée et lance l'icône de la barre système (s'exécute dans un thread)."""
+        if pystray is None:
+            print("pystray indisponible : pas d'icône dans la barre système.")
+            return
         try:
             image = Image.open("icon.png")
         except FileNotFoundError:
@@ -931,6 +3779,19 @@ class ProcessMonitorApp(ThemedTk):
         # Lancer la boucle de l'icône (cette ligne bloque ce thread)
         self.tray_icon.run()
 
+    def update_tray_icon(self, data):
+        """Remplace l'icône de la barre système, seulement si le changement est visible."""
+        if not self.tray_icon:
+            return
+        image = self.tray_sparkline.render(self.cpu_history, data['ram'], self.settings.cpu_threshold)
+        if image is None:
+            return
+        try:
+            self.tray_icon.icon = image
+            self.tray_icon.title = f"CPU {data['cpu']:.0f} % | RAM {data['ram']:.0f} %"
+        except Exception as e:
+            print(f"Erreur de mise à jour de l'icône : {e}")
+
     def show_window_from_tray(self):
         """
         Demande au thread Tkinter de ré-afficher la fenêtre.
@@ -948,6 +3809,59 @@ class ProcessMonitorApp(ThemedTk):
         self.after(0, self.quit_application) # Appelle la fermeture propre
 
 # --- Point d'entrée principal ---
+def replay_speed(value):
+    """Type argparse de '--speed' : 'max' (0 = sans attente) ou un nombre > 0."""
+    if value == "max":
+        return 0.0
+    try:
+        speed = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"vitesse invalide : '{value}' (nombre > 0 ou 'max')")
+    if not 0 < speed < float("inf"): # Rejette aussi nan
+        raise argparse.ArgumentTypeError(f"la vitesse doit être > 0 (ou 'max') : '{value}'")
+    return speed
+
+def parse_arguments():
+    """Options de la ligne de commande."""
+    parser = argparse.ArgumentParser(description="Moniteur de processus")
+    parser.add_argument("--record", metavar="FICHIER",
+                        help="enregistrer chaque tick dans un fichier (gzip, ajout seul)")
+    parser.add_argument("--collector", choices=COLLECTOR_MODES,
+                        help="collecte dans un thread ou un processus séparé (défaut : config.json)")
+    commands = parser.add_subparsers(dest="command")
+
+    replay = commands.add_parser("replay", help="rejouer un enregistrement")
+    replay.add_argument("file", help="fichier produit par --record")
+    replay.add_argument("--speed", type=replay_speed, default="1",
+                        help="vitesse : 1, 10... ou 'max' (benchmark du pipeline)")
+    replay.add_argument("--db", default="replay.db",
+                        help="base de données cible du rejeu (défaut : replay.db)")
+
+    report = commands.add_parser("report", help="générer un rapport HTML/PNG depuis l'historique")
+    report.add_argument("--db", default="system_monitor.db", help="base de données (défaut : system_monitor.db)")
+    report.add_argument("--days", type=int, default=7, help="période couverte, en jours (défaut : 7)")
+    report.add_argument("--out", default="rapport.html", help="fichier HTML (le PNG est écrit à côté)")
+    report.add_argument("--config", default="config.json", help="seuils d'alerte utilisés pour le temps au-dessus du seuil")
+
+    collector = commands.add_parser("collector",
+                                    help="lancer seul le collecteur (sans interface) ; la GUI s'y rattache")
+    collector.add_argument("--db", default="system_monitor.db", help="base de données (défaut : system_monitor.db)")
+    collector.add_argument("--config", default="config.json", help="fichier de réglages surveillé")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    app = ProcessMonitorApp()
-    app.mainloop()
\ No newline at end of file
+    # Exécutable gelé (PyInstaller) : le processus collecteur 'spawn' relance ce point
+    # d'entrée, freeze_support() l'intercepte avant l'analyse de la ligne de commande
+    multiprocessing.freeze_support()
+    args = parse_arguments()
+    if args.command == "collector":
+        # Collecteur sans interface (la GUI lancée avec --collector process s'y rattache)
+        run_collector_process(args.db, args.config, record_file=args.record)
+    elif args.command == "report":
+        generate_report(args.db, args.out, days=args.days, config_file=args.config)
+    else:
+        if args.command == "replay":
+            app = ProcessMonitorApp(replay_file=args.file, replay_speed=args.speed, db_name=args.db)
+        else:
+            app = ProcessMonitorApp(record_file=args.record, collector_mode=args.collector)
+        app.mainloop()
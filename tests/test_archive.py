@@ -0,0 +1,88 @@
+import datetime
+import os
+import sqlite3
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (ARCHIVE_COLUMNS, ARCHIVE_HEADER_V1, ARCHIVE_MAGIC_V1, ColumnarArchive,
+                  _wall_epoch, init_database)
+
+DAY = datetime.date(2026, 9, 1)
+START = datetime.datetime.combine(DAY, datetime.time())
+
+
+def make_db(seconds, cpu):
+    conn = sqlite3.connect(":memory:")
+    init_database(conn)
+    conn.executemany(
+        "INSERT INTO system_stats (timestamp, cpu_percent, ram_percent, fan_rpm, gpu_percent, proc_churn) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(START + datetime.timedelta(seconds=s), c, 40.0, 1200, None, 0.25) for s, c in zip(seconds, cpu)])
+    conn.commit()
+    return conn
+
+
+def test_round_trip_within_quantisation_error(tmp_path):
+    rng = np.random.default_rng(0)
+    seconds = np.arange(0, 86400, 7.3)
+    cpu = rng.random(len(seconds)) * 100
+    archive = ColumnarArchive(str(tmp_path))
+    assert archive.export_day(make_db(seconds, cpu), DAY) == len(seconds)
+
+    data = archive.load_range(START, START + datetime.timedelta(days=1))
+    step = 0.5 / ARCHIVE_COLUMNS["cpu_percent"]
+    assert len(data["cpu_percent"]) == len(seconds)
+    assert np.max(np.abs(data["cpu_percent"] - cpu)) <= step + 1e-9
+    assert np.max(np.abs(data["timestamp"] - (_wall_epoch(START) + seconds))) <= 0.5e-3 + 1e-9
+    assert np.all(data["gpu_percent"] == 0.0) # NULL -> 0
+    assert len(archive.index["days"][DAY.isoformat()]["blocks"]) == 24
+
+
+def test_short_range_matches_full_day(tmp_path):
+    seconds = np.arange(0, 86400, 1.0)
+    archive = ColumnarArchive(str(tmp_path))
+    archive.export_day(make_db(seconds, seconds % 100), DAY)
+
+    full = archive.load_range(START, START + datetime.timedelta(days=1))
+    begin = START + datetime.timedelta(hours=5, minutes=58)
+    part = archive.load_range(begin, begin + datetime.timedelta(minutes=5))
+    mask = (full["timestamp"] >= _wall_epoch(begin)) & (full["timestamp"] < _wall_epoch(begin) + 300)
+    assert len(part["timestamp"]) == 300
+    assert np.array_equal(part["cpu_percent"], full["cpu_percent"][mask])
+
+
+def test_empty_column_and_empty_day(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+    path = str(tmp_path / "empty.col")
+    archive._write_column(path, [], 100.0)
+    assert len(archive._read_column(path)) == 0
+
+    conn = sqlite3.connect(":memory:")
+    init_database(conn)
+    assert archive.export_day(conn, DAY) == 0
+    assert not archive.has_day(DAY)
+    assert all(len(v) == 0 for v in archive.load_range(START, START + datetime.timedelta(days=1)).values())
+
+
+def test_metric_missing_from_older_day_and_v1_files(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+    archive.export_day(make_db([0.0, 1.0, 2.0], [10.0, 20.0, 30.0]), DAY)
+    info = archive.index["days"][DAY.isoformat()]
+    # Journée archivée avant 'proc_churn' et avant les blocs (format PMC1)
+    info["metrics"].remove("proc_churn")
+    del info["blocks"]
+    day_dir = tmp_path / DAY.isoformat()
+    os.remove(day_dir / "proc_churn.col")
+    base = int(round(_wall_epoch(START) * 1000))
+    with open(day_dir / "timestamp.col", "wb") as f:
+        f.write(ARCHIVE_HEADER_V1.pack(ARCHIVE_MAGIC_V1, 1000.0, base, 3))
+        f.write(zlib.compress(np.array([1000, 1000], dtype=np.int32).tobytes()))
+
+    data = archive.load_range(START, START + datetime.timedelta(days=1))
+    assert list(data["timestamp"] - _wall_epoch(START)) == [0.0, 1.0, 2.0]
+    assert list(data["cpu_percent"]) == [10.0, 20.0, 30.0]
+    assert list(data["proc_churn"]) == [0.0, 0.0, 0.0]
@@ -0,0 +1,124 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CgroupCollector
+
+
+def write_cgroup(directory, usage_usec=0, memory_current=0, memory_max="max", io_stat=""):
+    """Crée (ou met à jour) un faux cgroup v2."""
+    os.makedirs(directory, exist_ok=True)
+    files = {
+        "cgroup.controllers": "cpu io memory\n",
+        "cpu.stat": f"usage_usec {usage_usec}\nuser_usec 0\nsystem_usec 0\n",
+        "memory.current": f"{memory_current}\n",
+        "memory.max": f"{memory_max}\n",
+        "io.stat": io_stat,
+    }
+    for name, content in files.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(content)
+
+
+def make_collector(root, proc_root=None):
+    collector = CgroupCollector(root=str(root), proc_root=str(proc_root or root / "proc"))
+    collector.cpu_count = 2
+    return collector
+
+
+def by_path(results):
+    return {r["path"]: r for r in results}
+
+
+def test_cpu_memory_and_io_parsing(tmp_path):
+    root = tmp_path / "cgroup"
+    write_cgroup(root)
+    write_cgroup(root / "app", usage_usec=1_000_000, memory_current=256, memory_max="max",
+                 io_stat="8:0 rbytes=100 wbytes=200 rios=1 wios=2\n")
+    write_cgroup(root / "db", memory_current=250, memory_max="1000")
+    collector = make_collector(root)
+
+    first = by_path(collector.scan(now=10.0))
+    assert set(first) == {"/", "/app", "/db"}
+    assert first["/app"]["cpu_percent"] is None # Pas de delta au premier passage
+    assert first["/app"]["memory_max"] is None  # "max" = pas de limite
+    assert first["/app"]["memory_percent"] is None
+    assert first["/db"]["memory_max"] == 1000
+    assert first["/db"]["memory_percent"] == 25.0
+
+    write_cgroup(root / "app", usage_usec=3_000_000, memory_current=256,
+                 io_stat="8:0 rbytes=1100 wbytes=200 rios=1 wios=2\n"
+                         "8:16 rbytes=0 wbytes=4200 rios=0 wios=3\n")
+    app = by_path(collector.scan(now=12.0))["/app"]
+    # 2 s CPU sur 2 s et 2 CPU = 50 %
+    assert app["cpu_percent"] == 50.0
+    assert app["io_read_bps"] == 500.0
+    assert app["io_write_bps"] == 2100.0
+
+
+def test_counter_reset_is_not_negative(tmp_path):
+    root = tmp_path / "cgroup"
+    write_cgroup(root)
+    write_cgroup(root / "svc", usage_usec=5_000_000, io_stat="8:0 rbytes=9000 wbytes=9000\n")
+    collector = make_collector(root)
+    collector.scan(now=0.0)
+
+    # Service redémarré : compteurs repartis de zéro
+    write_cgroup(root / "svc", usage_usec=100, io_stat="8:0 rbytes=10 wbytes=10\n")
+    svc = by_path(collector.scan(now=1.0))["/svc"]
+    assert svc["cpu_percent"] is None
+    assert svc["io_read_bps"] is None
+    assert svc["io_write_bps"] is None
+
+    # Le passage suivant repart des nouvelles valeurs
+    write_cgroup(root / "svc", usage_usec=1_000_100, io_stat="8:0 rbytes=110 wbytes=10\n")
+    svc = by_path(collector.scan(now=2.0))["/svc"]
+    assert svc["cpu_percent"] == 50.0
+    assert svc["io_read_bps"] == 100.0
+    assert svc["io_write_bps"] == 0.0
+
+
+def test_recreated_cgroup_is_rebaselined(tmp_path):
+    root = tmp_path / "cgroup"
+    write_cgroup(root)
+    write_cgroup(root / "job", usage_usec=1000)
+    collector = make_collector(root)
+    collector.scan(now=0.0)
+
+    # Supprimé puis recréé entre deux passages, compteur déjà plus haut
+    for name in os.listdir(root / "job"):
+        os.remove(root / "job" / name)
+    os.rmdir(root / "job")
+    write_cgroup(root / "other") # Évite la réutilisation immédiate de l'inode
+    write_cgroup(root / "job", usage_usec=5000)
+    assert by_path(collector.scan(now=1.0))["/job"]["cpu_percent"] is None
+
+
+def test_cgroup_of_relative_to_subtree_root(tmp_path):
+    mount = tmp_path / "cgroup"
+    root = mount / "system.slice"
+    write_cgroup(mount)
+    write_cgroup(root)
+    write_cgroup(root / "nginx.service")
+    proc = tmp_path / "proc"
+    os.makedirs(proc / "self")
+    (proc / "self" / "mountinfo").write_text(
+        f"30 20 0:26 / {tmp_path}/tmpfs rw - tmpfs tmpfs rw\n"
+        f"36 25 0:31 / {mount} rw,nosuid - cgroup2 cgroup2 rw\n")
+    for pid, path in ((10, "/system.slice/nginx.service"), (11, "/user.slice/session-1.scope")):
+        os.makedirs(proc / str(pid))
+        (proc / str(pid) / "cgroup").write_text(f"0::{path}\n")
+
+    collector = make_collector(root, proc)
+    assert collector.hierarchy_prefix == "/system.slice"
+    assert "/nginx.service" in by_path(collector.scan(now=0.0))
+    assert collector.cgroup_of(10) == "/nginx.service"
+    assert collector.cgroup_of(11) == "?" # Hors de la racine surveillée
+    assert collector.cgroup_of(12) == "?" # PID disparu
+
+    # Migration : visible après le scan suivant
+    (proc / "10" / "cgroup").write_text("0::/system.slice\n")
+    assert collector.cgroup_of(10) == "/nginx.service"
+    collector.scan(now=1.0)
+    assert collector.cgroup_of(10) == "/"
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import _build_tree_groups
+
+
+def proc(pid, ppid, cpu, create_time):
+    return {"pid": pid, "ppid": ppid, "name": f"p{pid}", "cpu_percent": cpu,
+            "memory_percent": 1.0, "create_time": create_time}
+
+
+def test_parent_born_after_child_is_a_root():
+    # PID 20 réutilisé : son ppid (10) pointe vers un processus plus récent que lui
+    groups = _build_tree_groups([proc(10, 20, 50.0, 100.0), proc(20, 10, 30.0, 200.0)])
+    assert [(g["pid"], g["cpu_percent"], g["count"]) for g in groups] == [(10, 80.0, 2)]
+
+
+def test_ppid_cycle_with_equal_create_times_keeps_every_process():
+    groups = _build_tree_groups([proc(10, 20, 50.0, 100.0), proc(20, 10, 30.0, 100.0),
+                                 proc(30, 20, 5.0, 150.0), proc(4, 0, 1.0, 1.0)])
+    assert sum(g["count"] for g in groups) == 4
+    assert sum(g["cpu_percent"] for g in groups) == 86.0
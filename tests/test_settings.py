@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Settings
+
+
+def test_booleans_from_hand_edited_config():
+    assert Settings.from_config({"archive_enabled": "false"}).archive_enabled is False
+    assert Settings.from_config({"archive_enabled": "0"}).archive_enabled is False
+    assert Settings.from_config({"anomaly_alerts": "True"}).anomaly_alerts is True
+    assert Settings.from_config({"baseline_hourly": False}).baseline_hourly is False
+
+
+def test_invalid_boolean_falls_back_to_default(capsys):
+    settings = Settings.from_config({"archive_enabled": "yes", "anomaly_alerts": None})
+    assert settings.archive_enabled is Settings.archive_enabled
+    assert settings.anomaly_alerts is Settings.anomaly_alerts
+    assert "Valeur invalide pour 'archive_enabled'" in capsys.readouterr().out
@@ -0,0 +1,90 @@
+import os
+import struct
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import RING_SEQ_OFFSET, RING_SLOT_HEADER, SharedRing
+
+
+@pytest.fixture
+def ring_pair():
+    """Écrivain + lecteur rattaché, sur un petit anneau propre au test."""
+    name = f"pm_test_{uuid.uuid4().hex[:12]}"
+    writer = SharedRing.create(name, slot_count=4, slot_size=128)
+    reader = SharedRing.attach(name)
+    yield writer, reader
+    reader.close()
+    writer.close(unlink=True)
+
+
+def test_messages_in_order(ring_pair):
+    writer, reader = ring_pair
+    for i in range(3):
+        writer.publish({"n": i})
+    assert reader.read() == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert reader.read() == []
+    assert not writer.take_resync()
+
+
+def test_overrun_keeps_latest_and_requests_resync(ring_pair):
+    writer, reader = ring_pair
+    for i in range(10):
+        writer.publish({"n": i})
+    assert reader.read() == [{"n": 6}, {"n": 7}, {"n": 8}, {"n": 9}]
+    assert writer.take_resync()
+    assert not writer.take_resync() # Demande consommée
+
+
+def test_slot_being_written_is_skipped(ring_pair):
+    writer, reader = ring_pair
+    writer.publish({"n": 1})
+    writer.publish({"n": 2})
+    # Écrivain interrompu au milieu de la 2e écriture : séquence remise à 0
+    RING_SLOT_HEADER.pack_into(writer.shm.buf, writer._slot_offset(2), 0, 0)
+    assert reader.read() == [{"n": 1}]
+    assert writer.take_resync()
+
+
+def test_slot_overwritten_during_copy(ring_pair, monkeypatch):
+    writer, reader = ring_pair
+    writer.publish({"n": 1})
+    real = RING_SLOT_HEADER
+
+    class OverwrittenAfterFirstCheck:
+        """Le 2e examen de l'en-tête voit la séquence d'un message plus récent."""
+        size = real.size
+        calls = 0
+
+        def unpack_from(self, buf, offset):
+            seq, length = real.unpack_from(buf, offset)
+            OverwrittenAfterFirstCheck.calls += 1
+            return (seq + 4 if OverwrittenAfterFirstCheck.calls == 2 else seq), length
+
+    monkeypatch.setattr(main, "RING_SLOT_HEADER", OverwrittenAfterFirstCheck())
+    assert reader.read() == []
+    assert writer.take_resync()
+
+
+def test_recreated_ring_restarts_sequence(ring_pair):
+    writer, reader = ring_pair
+    for i in range(3):
+        writer.publish({"n": i})
+    reader.read()
+    # Nouveau collecteur : séquence d'écriture repartie de zéro
+    struct.pack_into("<Q", writer.shm.buf, RING_SEQ_OFFSET, 0)
+    writer.publish({"n": "new"})
+    assert reader.read() == [{"n": "new"}]
+
+
+def test_oversize_message_is_dropped(ring_pair, capsys):
+    writer, reader = ring_pair
+    writer.publish({"blob": "x" * 500})
+    assert "trop grand" in capsys.readouterr().out
+    assert struct.unpack_from("<Q", writer.shm.buf, RING_SEQ_OFFSET)[0] == 0
+    writer.publish({"n": 1})
+    assert reader.read() == [{"n": 1}]